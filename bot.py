@@ -1,60 +1,465 @@
 import discord
 from discord.ext import commands
 
+import ast
+import asyncio
+import hashlib
+import importlib.util
+import json
 import logging
+import time
+from collections.abc import Collection
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
 from ruamel.yaml import YAML
 
+from core.authors import author_ids
+
+class PrefixIndex:
+    """
+    Precompiled table of the command prefixes of every guild.
+
+    Every guild (and None, for DMs and unconfigured guilds) maps to its prefixes, longest first,
+    and the set of characters those prefixes start with, so most messages can be turned down
+    by checking a single character.
+    """
+    __slots__ = ("_table", "_default")
+
+    def __init__(self, default: "str | Collection[str]", guilds: "dict[int, str | Collection[str]]"):
+        self._default = self._compile(default)
+        self._table = {int(gid): self._compile(p) for gid, p in guilds.items()}
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "PrefixIndex":
+        return cls(config.default_prefix, config.prefixes)
+
+    @staticmethod
+    def _compile(prefixes: "str | Collection[str]") -> "tuple[tuple[str], frozenset[str]]":
+        if isinstance(prefixes, str): prefixes = (prefixes, )
+
+        # longest first, otherwise "??" would always be matched as "?"
+        prefixes = tuple(sorted(dict.fromkeys(p for p in prefixes if p), key=len, reverse=True))
+        if not prefixes:
+            raise ValueError("a guild needs at least one non-empty prefix")
+        return prefixes, frozenset(p[0] for p in prefixes)
+
+    def get(self, guild_id: "int | None") -> "tuple[str]":
+        """
+        Gets the prefixes of a guild, or the default prefixes if it has none (or it's a DM)
+        """
+        return self._table.get(guild_id, self._default)[0]
+
+    def could_match(self, msg: discord.Message) -> bool:
+        """
+        Checks if a message starts with one of the prefixes of its guild
+        """
+        content = msg.content
+        if not content: return False
+
+        prefixes, first = self._table.get(msg.guild and msg.guild.id, self._default)
+        return content[0] in first and content.startswith(prefixes)
+
 def _get_cmd_prefix(bot: commands.Bot, msg: discord.Message) -> "tuple[str]":
     """
     Gets the command prefix based off the guild of the message
     """
-    def_prefix = bot.config["default_prefix"]
-    guild_prefixes = bot.config["prefixes"]
-
     # if dm, use default prefix
-    if msg.guild is None:
-        return (def_prefix, )
+    # if guild, use the guild's prefix, or if it doesn't exist, use the default
+    return bot.prefix_index.get(msg.guild and msg.guild.id)
+
+_IS_OWNER_CHECK = commands.is_owner()(lambda ctx: None).__commands_checks__[0].__code__
+
+def _is_owner_check(check) -> bool:
+    # every commands.is_owner() makes a new predicate, but they all share the same code
+    return getattr(check, "__code__", None) is _IS_OWNER_CHECK
+
+def _read_dependencies(path: Path) -> "tuple[str]":
+    """
+    Reads the DEPENDENCIES tuple of an extension without importing it.
+
+    An extension can declare `DEPENDENCIES = ("core.error", ...)` at the top level of its module,
+    and it will only be loaded once all of those extensions have loaded.
+    """
+    try:
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    except (OSError, SyntaxError, ValueError):
+        # let load_extension report the actual error
+        return ()
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "DEPENDENCIES" for t in node.targets):
+            try:
+                deps = ast.literal_eval(node.value)
+            except ValueError:
+                return ()
+            if isinstance(deps, str): return (deps, )
+            try:
+                return tuple(deps)
+            except TypeError:
+                return ()
+    return ()
+
+def _source_hash(name: str) -> "str | None":
+    """
+    Hash of the source of an extension (every .py file in it, if it's a package),
+    or None if it can't be found
+    """
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None: return None
+
+    origin = Path(spec.origin)
+    files = sorted(origin.parent.rglob("*.py")) if spec.submodule_search_locations else [origin]
+    digest = hashlib.sha1()
+    for f in files:
+        try:
+            digest.update(f.read_bytes())
+        except OSError:
+            return None
+    return digest.hexdigest()
+
+def _make_flags(cls: "type[discord.flags.BaseFlags]", spec: "str | Collection[str]"):
+    """
+    Makes a set of flags (intents, member cache flags) from either the name of a preset
+    ("all", "none", or "default"), or a list of flag names
+    """
+    if isinstance(spec, str):
+        if spec not in ("all", "none", "default") or not hasattr(cls, spec):
+            raise ValueError(f"{cls.__name__} has no preset {spec!r}")
+        return getattr(cls, spec)()
+
+    unknown = set(spec) - cls.VALID_FLAGS.keys()
+    if unknown:
+        raise ValueError(f"unknown {cls.__name__}: {', '.join(sorted(unknown))}")
+    flags = cls.none() # some flag classes start out with everything enabled
+    for name in spec:
+        setattr(flags, name, True)
+    return flags
+
+def _build_profile(profile: dict) -> dict:
+    """
+    Turns an intent/cache profile from the config into the matching keyword arguments of commands.Bot
+    """
+    intents = _make_flags(discord.Intents, profile["intents"])
+    if profile["member_cache"] == "from_intents":
+        member_cache = discord.MemberCacheFlags.from_intents(intents)
     else:
-        # if guild, use the guild's prefix, or if it doesn't exist, use the default
-        return (guild_prefixes.get(msg.guild.id, def_prefix), )
+        member_cache = _make_flags(discord.MemberCacheFlags, profile["member_cache"])
+
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache,
+        "chunk_guilds_at_startup": profile["chunk_guilds"],
+        "max_messages": profile["max_messages"]
+    }
 
 DEFAULT_CONFIG_PATH = Path("config/default_config.yml")
 CONFIG_PATH = Path("config/config.yml")
+MANIFEST_PATH = Path("cache/cog_manifest.json")
+MANIFEST_VERSION = 4
+CONFIG_POLL_SECONDS = 2
+
+# config settings which only take effect on a restart
+RESTART_SETTINGS = ("token_file", "sharding", "profile", "profiles", "lazy_cogs", "metrics_port")
+
+def _frozen_map(raw, key: str, convert) -> "MappingProxyType":
+    if not isinstance(raw, dict):
+        raise ValueError(f"config: {key} should be a mapping, not {type(raw).__name__}")
+    return MappingProxyType({int(k): convert(v) for k, v in raw.items()})
+
+def _prefixes(raw) -> "tuple[str]":
+    return (raw, ) if isinstance(raw, str) else tuple(map(str, raw))
+
+def _ids(raw) -> "frozenset[int]":
+    return frozenset([raw]) if isinstance(raw, int) else frozenset(map(int, raw))
+
+def _profiles(raw) -> "MappingProxyType[str, MappingProxyType]":
+    if not isinstance(raw, dict):
+        raise ValueError(f"config: profiles should be a mapping, not {type(raw).__name__}")
+    for name, profile in raw.items():
+        if not isinstance(profile, dict):
+            raise ValueError(f"config: profile {name!r} should be a mapping, not {type(profile).__name__}")
+    return MappingProxyType({str(k): MappingProxyType(v) for k, v in raw.items()})
+
+@dataclass(frozen=True)
+class ShardingConfig:
+    shard_count: "int | None"
+    processes: int
+    ipc_port: int
+
+    @classmethod
+    def from_dict(cls, raw) -> "ShardingConfig":
+        if not isinstance(raw, dict):
+            raise ValueError(f"config: sharding should be a mapping, not {type(raw).__name__}")
+        try:
+            config = cls(
+                shard_count=None if raw["shard_count"] is None else int(raw["shard_count"]),
+                processes=int(raw["processes"]),
+                ipc_port=int(raw["ipc_port"]),
+            )
+        except KeyError as e:
+            raise ValueError(f"config: missing sharding.{e.args[0]}") from e
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"config: sharding: {e}") from e
+
+        if config.shard_count is not None and config.shard_count < 1:
+            raise ValueError(f"config: sharding.shard_count should be at least 1, not {config.shard_count}")
+        if config.processes < 1:
+            raise ValueError(f"config: sharding.processes should be at least 1, not {config.processes}")
+        if config.processes > 1 and config.shard_count is None:
+            raise ValueError("config: sharding.shard_count has to be set to run more than one process")
+        if config.shard_count is not None and config.processes > config.shard_count:
+            raise ValueError(f"config: can't split {config.shard_count} shards over {config.processes} processes")
+        if not 0 < config.ipc_port < 65536:
+            raise ValueError(f"config: sharding.ipc_port should be a port number, not {config.ipc_port}")
+        return config
 
-class CSClubBot(commands.Bot):
+@dataclass(frozen=True)
+class Config:
+    """
+    A validated, read-only snapshot of the config.
+
+    The bot swaps in a whole new snapshot whenever config.yml changes, so anything
+    that needs a consistent view of the config should keep hold of one snapshot.
+    """
+    default_prefix: "tuple[str]"
+    main_server: int
+    prefixes: "MappingProxyType[int, tuple[str]]"
+    error_channels: "MappingProxyType[int, int]"
+    error_window: float
+    watch_extensions: bool
+    metrics_port: "int | None"
+    lazy_cogs: bool
+    dev_roles: "MappingProxyType[int, frozenset[int]]"
+    token_file: str
+    sharding: ShardingConfig
+    profile: str
+    profiles: "MappingProxyType[str, MappingProxyType]"
+    poll_db: str
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "Config":
+        """
+        Checks and converts the parsed YAML, raises ValueError if anything is off
+        """
+        try:
+            config = cls(
+                default_prefix=_prefixes(raw["default_prefix"]),
+                main_server=int(raw["main_server"]),
+                prefixes=_frozen_map(raw["prefixes"], "prefixes", _prefixes),
+                error_channels=_frozen_map(raw["error_channels"], "error_channels", int),
+                error_window=float(raw["error_window"]),
+                watch_extensions=bool(raw["watch_extensions"]),
+                metrics_port=None if raw["metrics_port"] is None else int(raw["metrics_port"]),
+                lazy_cogs=bool(raw["lazy_cogs"]),
+                dev_roles=_frozen_map(raw["dev_roles"], "dev_roles", _ids),
+                token_file=str(raw["token_file"]),
+                sharding=ShardingConfig.from_dict(raw["sharding"]),
+                profile=str(raw["profile"]),
+                profiles=_profiles(raw["profiles"]),
+                poll_db=str(raw["poll_db"])
+            )
+        except KeyError as e:
+            raise ValueError(f"config: missing {e.args[0]}") from e
+        except TypeError as e:
+            raise ValueError(f"config: {e}") from e
+
+        if config.profile not in config.profiles:
+            raise ValueError(f"config: unknown profile {config.profile!r}, expected one of {', '.join(config.profiles)}")
+        return config
+
+def load_config() -> Config:
+    """
+    Loads the default config, overridden by anything in config.yml
+    """
+    yml = YAML(typ='safe')
+
+    # load default config settings
+    with open(DEFAULT_CONFIG_PATH) as cfg_file:
+        config = yml.load(cfg_file)
+
+    # load cfg if exists, otherwise save
+    if CONFIG_PATH.exists():
+        with open(CONFIG_PATH) as cfg_file:
+            config.update(yml.load(cfg_file) or {})
+    else:
+        yml.dump(config, CONFIG_PATH)
+
+    return Config.from_dict(config)
+
+def read_token(config: Config) -> str:
+    with open(config.token_file) as token_file:
+        return token_file.read().splitlines()[0]
+
+class CSClubContext(commands.Context):
+    """
+    Context that keeps track of how long each part of handling its command took (see CSClubBot.invoke).
+    Times are in seconds, under "parse", "checks" (which includes converting arguments), "callback", and "send".
+    """
+    def __init__(self, **attrs):
+        super().__init__(**attrs)
+        self.timings: "dict[str, float]" = {"parse": 0.0, "checks": 0.0, "callback": 0.0, "send": 0.0}
+        self._phase_start = time.perf_counter()
+
+    def _end_phase(self, phase: str):
+        now = time.perf_counter()
+        self.timings[phase] = now - self._phase_start
+        self._phase_start = now
+
+    async def send(self, *args, **kwargs) -> discord.Message:
+        start = time.perf_counter()
+        try:
+            return await super().send(*args, **kwargs)
+        finally:
+            self.timings["send"] += time.perf_counter() - start
+
+class LazyCog(commands.Cog):
+    """
+    Stands in for a cog of a lazy extension until the extension is loaded,
+    so its stub commands show up in help under the same name and category as the real ones
+    """
+    def __init__(self, bot: commands.Bot, ext: str, info: dict, stubs: "list[commands.Command]"):
+        self.bot = bot
+        self.ext = ext
+        self.__cog_name__ = info["cog"]
+        self.description = info["cog_description"] or ""
+        self.AUTHORS = tuple(info["cog_authors"])
+        if info["category"] is not None: self.HELP_CATEGORY = info["category"]
+        self.__cog_commands__ = tuple(stubs)
+
+class CSClubBot(commands.AutoShardedBot):
     def __init__(self, *args, **kwargs):
         logging.basicConfig(level=logging.INFO, format='[%(name)s %(levelname)s] %(message)s')
         self.logger = logging.getLogger('bot')
 
-        yml = YAML(typ='safe')
-
-        # load default config settings
-        with open(DEFAULT_CONFIG_PATH) as cfg_file:
-            self.config = yml.load(cfg_file)
-
-        # load cfg if exists, otherwise save
-        if CONFIG_PATH.exists():
-            with open(CONFIG_PATH) as cfg_file:
-                self.config.update(yml.load(cfg_file))
-        else:
-            yml.dump(self.config, CONFIG_PATH)
+        self.config = load_config()
+        self.rebuild_prefixes()
 
+        # build every profile, so a typo in an unused one still shows up
+        self.profiles = {name: _build_profile(p) for name, p in self.config.profiles.items()}
+        self.profile = self.config.profile
 
         # do rest of init
         am = discord.AllowedMentions.none() # should not ever ping
-        intents = discord.Intents.all()
-        super().__init__(command_prefix=_get_cmd_prefix, allowed_mentions=am, intents=intents, *args, **kwargs)
+        super().__init__(command_prefix=_get_cmd_prefix, allowed_mentions=am, *args, **{**self.profiles[self.profile], **kwargs})
+        self.logger.info(f'Using profile {self.profile}')
+
+        # extension name -> manifest entry, for every lazy extension that only has stub commands right now
+        self.lazy_stubs: "dict[str, dict]" = {}
+        self._lazy_locks: "dict[str, asyncio.Lock]" = {}
+
+        # bumped whenever a cog is added or removed, so anything built from the cogs knows to rebuild
+        self.cog_generation = 0
+
+        # extension name -> hash of its source when it was (re)loaded, see changed_extensions
+        self.source_hashes: "dict[str, str | None]" = {}
+
+        # connection to the other processes, if this is one of several (see cluster.py)
+        self.ipc = None
+
+        # runs after the checks & argument parsing of every command, right before its callback
+        self.before_invoke(self._checks_done)
+
+    def rebuild_prefixes(self):
+        """
+        Recompiles the prefix table from the config. The new table replaces the old one in one go,
+        so messages never see a half-built table.
+        """
+        self.prefix_index = PrefixIndex.from_config(self.config)
+
+    async def reload_config(self) -> bool:
+        """
+        Reads config.yml again (off of the event loop) and swaps in the new snapshot if it's valid
+        """
+        try:
+            config = await asyncio.to_thread(load_config)
+            prefix_index = PrefixIndex.from_config(config)
+        except Exception as e:
+            self.logger.error(f'Not applying config changes, config is invalid: {e}')
+            return False
+
+        # no awaits in between, so nothing ever sees the new config with the old prefixes
+        old, self.config, self.prefix_index = self.config, config, prefix_index
+
+        changed = [k for k in RESTART_SETTINGS if getattr(old, k) != getattr(config, k)]
+        if changed:
+            self.logger.warning(f'Config changes to {", ".join(changed)} will only apply after a restart')
+        self.logger.info('Reloaded config')
+        self.dispatch('config_update', old, config)
+        return True
+
+    async def watch_config(self):
+        """
+        Reloads the config whenever config.yml is modified
+        """
+        def mtime():
+            try: return CONFIG_PATH.stat().st_mtime_ns
+            except OSError: return None
+
+        last = mtime()
+        while not self.is_closed():
+            await asyncio.sleep(CONFIG_POLL_SECONDS)
+            current = mtime()
+            if current != last:
+                last = current
+                await self.reload_config()
+
+    async def setup_hook(self) -> None:
+        self._config_watcher = asyncio.create_task(self.watch_config(), name="config watcher")
+
+    async def process_commands(self, message: discord.Message, /) -> None:
+        # turn down anything that can't be a command before discord.py builds a whole Context for it
+        if message.author.bot or not self.prefix_index.could_match(message):
+            return
+        await super().process_commands(message)
+
+    async def get_context(self, origin, /, *, cls=None) -> commands.Context:
+        start = time.perf_counter()
+        ctx = await super().get_context(origin, cls=cls or CSClubContext)
+        if isinstance(ctx, CSClubContext):
+            ctx.timings["parse"] = time.perf_counter() - start
+        return ctx
+
+    async def invoke(self, ctx: commands.Context, /) -> None:
+        """
+        Runs a command, then dispatches command_timed with how long it took (see core.metrics).
+        While it runs, the task is named after the command.
+        """
+        timed = isinstance(ctx, CSClubContext) and ctx.command is not None
+        if timed: ctx._phase_start = time.perf_counter()
+
+        # name the task after the command, so core.watchdog can tell what blocked the loop
+        task = asyncio.current_task()
+        task_name = task.get_name()
+        if ctx.command is not None: task.set_name(f"command: {ctx.command.qualified_name}")
+        try:
+            await super().invoke(ctx)
+        finally:
+            task.set_name(task_name)
+
+        if timed:
+            if ctx.timings["checks"] == 0.0:
+                # it never got past the checks
+                ctx._end_phase("checks")
+            else:
+                ctx._end_phase("callback")
+                # sending happens inside the callback, it's counted separately
+                ctx.timings["callback"] = max(0.0, ctx.timings["callback"] - ctx.timings["send"])
+            self.dispatch('command_timed', ctx)
+
+    async def _checks_done(self, ctx: commands.Context):
+        if isinstance(ctx, CSClubContext): ctx._end_phase("checks")
 
     async def on_ready(self):
         self.logger.info(f'Connected to {self.user}')
-        self.logger.info(f'Guilds  : {len(self.guilds)}')
-        self.logger.info(f'Users   : {len(set(self.get_all_members()))}')
-        self.logger.info(f'Channels: {len(list(self.get_all_channels()))}')
+        # guild/member/channel counts are logged by core.stats
 
-    async def load_module(self, module: str):
+    async def load_module(self, module: str) -> bool:
         """
-        Loads a module
+        Loads a module, returns whether it was successful
         """
         try:
             await self.load_extension(module)
@@ -63,34 +468,354 @@ class CSClubBot(commands.Bot):
             print()
             self.logger.exception(e)
             print()
+            return False
         else:
             self.logger.info(f'Loaded module {module}.')
+            return True
 
-    async def load_dir(self, directory: str):
+    async def load_extension(self, name: str, *, package: "str | None" = None) -> None:
+        # the real commands would clash with any lazy stubs, so take those out first
+        stubs = self.lazy_stubs.pop(name, None)
+        if stubs is not None: await self.remove_stubs(stubs)
+
+        source_hash = _source_hash(name)
+        try:
+            await super().load_extension(name, package=package)
+        except Exception:
+            if stubs is not None: await self.add_stubs(name, stubs)
+            raise
+        self.source_hashes[name] = source_hash
+
+    async def reload_extension(self, name: str, *, package: "str | None" = None) -> None:
+        source_hash = _source_hash(name)
+        await super().reload_extension(name, package=package)
+        self.source_hashes[name] = source_hash
+
+    async def unload_extension(self, name: str, *, package: "str | None" = None) -> None:
+        await super().unload_extension(name, package=package)
+        self.source_hashes.pop(name, None)
+
+    async def changed_extensions(self) -> "dict[str, str | None]":
         """
-        Loads all modules in a directory
+        Loaded extensions whose source changed since they were (re)loaded, mapped to their new hash
+        """
+        loaded = list(self.extensions)
+        hashes = await asyncio.to_thread(lambda: [_source_hash(e) for e in loaded])
+        return {e: h for e, h in zip(loaded, hashes) if h != self.source_hashes.get(e)}
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs) -> None:
+        await super().add_cog(cog, **kwargs)
+        self.cog_generation += 1
+        self.dispatch_early('cog_add', cog)
+
+    async def remove_cog(self, name: str, /, **kwargs) -> "commands.Cog | None":
+        cog = await super().remove_cog(name, **kwargs)
+        self.cog_generation += 1
+        if cog is not None: self.dispatch_early('cog_remove', cog)
+        return cog
+
+    def dispatch_early(self, event: str, /, *args):
+        """
+        Dispatches an event that might happen before login (like the cogs loaded in start).
+        discord.py can't dispatch anything until then, so those are dropped.
+        """
+        if isinstance(self.loop, asyncio.AbstractEventLoop):
+            self.dispatch(event, *args)
+
+    def find_modules(self, directory: str) -> "dict[str, Path]":
+        """
+        Finds all modules in a directory, mapped to their source file
         """
         path = Path(directory)
         if not path.is_dir(): 
             self.logger.info(f"Directory {directory} does not exist, skipping")
-            return
+            return {}
+
+        return {f"{directory}.{p.stem}": p for p in sorted(path.iterdir()) if p.suffix == ".py"}
+
+    async def load_dir(self, directory: str):
+        """
+        Loads all modules in a directory
+        """
+        await self.load_dirs(directory)
+
+    async def load_dirs(self, *directories: str, skip: "Collection[str]" = ()):
+        """
+        Loads all modules in the given directories, concurrently where their dependencies allow.
+
+        Every module in a directory waits for the modules of the directories before it to finish
+        (so core is always loaded before cogs), but only the ones it declares in DEPENDENCIES
+        have to have loaded successfully. Otherwise one broken core module would keep every cog
+        (including the dev cog, which could reload it) from loading.
+        """
+        deps: "dict[str, set[str]]" = {}
+        after: "dict[str, set[str]]" = {}
+        earlier = set()
+        for directory in directories:
+            modules = {m: p for m, p in self.find_modules(directory).items() if m not in skip}
+            for name, path in modules.items():
+                deps[name] = set(_read_dependencies(path)) - {name}
+                after[name] = earlier - deps[name]
+            earlier |= modules.keys()
+
+        cyclic = self._find_cycles({m: deps[m] | after[m] for m in deps})
+        timings: "dict[str, tuple[str, float, float]]" = {}
+        tasks: "dict[str, asyncio.Task]" = {}
+
+        async def load(module: str) -> bool:
+            # don't wait on anything in a cycle, it would never finish
+            if module in cyclic:
+                self.logger.error(f'Not loading module {module}, it has a circular dependency')
+                timings[module] = ("cyclic", 0, 0)
+                return False
+
+            start = time.perf_counter()
+            for prev in after[module]:
+                await tasks[prev]
+
+            missing = []
+            for dep in deps[module]:
+                if dep in tasks:
+                    if not await tasks[dep]: missing.append(dep)
+                elif dep not in self.extensions:
+                    missing.append(dep)
+            waited = time.perf_counter() - start
+
+            if missing:
+                self.logger.error(f'Not loading module {module}, missing dependencies: {", ".join(missing)}')
+                timings[module] = ("skipped", waited, 0)
+                return False
+
+            start = time.perf_counter()
+            ok = await self.load_module(module)
+            timings[module] = ("loaded" if ok else "failed", waited, time.perf_counter() - start)
+            return ok
 
-        modules = [f"{directory}.{p.stem}" for p in path.iterdir() if p.suffix == ".py"]
-        for m in modules:
-            await self.load_module(m)
+        start = time.perf_counter()
+        # create every task before any of them runs, so dependencies can always be looked up
+        for m in deps:
+            tasks[m] = asyncio.create_task(load(m), name=f"load {m}")
+        await asyncio.gather(*tasks.values())
+        self.log_load_timings(timings, time.perf_counter() - start)
+
+    @staticmethod
+    def _find_cycles(deps: "dict[str, set[str]]") -> "set[str]":
+        """
+        Finds all modules that can never load, because they're in (or depend on) a dependency cycle
+        """
+        remaining = {m: {d for d in ds if d in deps} for m, ds in deps.items()}
+        ready = [m for m, ds in remaining.items() if not ds]
+        while ready:
+            m = ready.pop()
+            del remaining[m]
+            for other, ds in remaining.items():
+                if m in ds:
+                    ds.discard(m)
+                    if not ds: ready.append(other)
+        return set(remaining)
+
+    def log_load_timings(self, timings: "dict[str, tuple[str, float, float]]", total: float):
+        """
+        Logs a table of how long each module waited for its dependencies and took to load
+        """
+        if not timings: return
+
+        width = max(len(m) for m in timings)
+        self.logger.info(f'{"Module".ljust(width)}  {"Status":<8} {"Waited":>9} {"Load":>9}')
+        for m, (status, waited, took) in sorted(timings.items(), key=lambda t: -t[1][2]):
+            self.logger.info(f'{m.ljust(width)}  {status:<8} {waited * 1000:>7.1f}ms {took * 1000:>7.1f}ms')
+        self.logger.info(f'Loaded modules in {total * 1000:.1f}ms')
+
+    ### LAZY LOADING ###
+
+    def read_manifest(self) -> "dict[str, dict]":
+        """
+        Reads the cached commands of every cog, or nothing if there is no usable manifest
+        """
+        try:
+            with open(MANIFEST_PATH) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get("version") != MANIFEST_VERSION: return {}
+        return manifest.get("extensions", {})
+
+    def write_manifest(self, directory: str, previous: "dict[str, dict]"):
+        """
+        Saves the commands of every loaded (or still lazy) extension in a directory to the manifest
+        """
+        extensions = {}
+        for ext, path in self.find_modules(directory).items():
+            if ext in self.extensions:
+                extensions[ext] = self.manifest_entry(ext, path)
+            elif ext in self.lazy_stubs:
+                extensions[ext] = previous[ext]
+
+        MANIFEST_PATH.parent.mkdir(exist_ok=True)
+        with open(MANIFEST_PATH, "w") as manifest_file:
+            json.dump({"version": MANIFEST_VERSION, "extensions": extensions}, manifest_file, indent=1)
+
+    def manifest_entry(self, ext: str, path: Path) -> dict:
+        """
+        Describes the top level commands of a loaded extension, and whether it could be loaded lazily
+        """
+        stat = path.stat()
+        cmds = [c for c in self.commands if c.module == ext]
+        cogs = [c for c in self.cogs.values() if c.__module__ == ext]
+        listens = any(c.get_listeners() for c in cogs) or \
+                  any(f.__module__ == ext for fs in self.extra_events.values() for f in fs)
+        # e.g. cogs.dev starts its extension watcher in cog_load, which a stub would never get to
+        starts = any(type(c).cog_load is not commands.Cog.cog_load for c in cogs)
+        # a stub can only copy is_owner, any other check has to be there from the start (see _stub_command)
+        guarded = any(type(c).cog_check is not commands.Cog.cog_check for c in cogs) or \
+                  any(not _is_owner_check(check) for c in cmds for check in c.checks)
+
+        return {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            # an extension can only wait to be loaded if it's only reachable through its commands
+            "eager": listens or starts or guarded or not cmds,
+            "commands": [self.manifest_command(c) for c in cmds]
+        }
+
+    @staticmethod
+    def manifest_command(cmd: commands.Command) -> dict:
+        """
+        Everything help shows about a command, so its stub can be shown the same way
+        """
+        cog = cmd.cog
+        return {
+            "name": cmd.name,
+            "aliases": list(cmd.aliases),
+            "help": cmd.help,
+            "brief": cmd.brief,
+            "usage": cmd.signature,
+            "hidden": cmd.hidden,
+            "owner_only": any(_is_owner_check(check) for check in cmd.checks),
+            "authors": author_ids(cmd.callback),
+            "cog": cog and cog.qualified_name,
+            "cog_description": cog and cog.description,
+            "cog_authors": cog and author_ids(cog),
+            "category": getattr(cog, "HELP_CATEGORY", None),
+        }
+
+    def find_lazy_modules(self, directory: str, manifest: "dict[str, dict]") -> "dict[str, dict]":
+        """
+        Finds all modules in a directory that can be replaced with stubs, mapped to their manifest entry
+        """
+        modules = self.find_modules(directory)
+        deps = {m: _read_dependencies(p) for m, p in modules.items()}
+        needed = {d for ds in deps.values() for d in ds}
+
+        lazy = {}
+        for ext, path in modules.items():
+            entry = manifest.get(ext)
+            # anything changed since the manifest was written has to be loaded to find its commands again
+            if entry is None or entry["eager"] or ext in needed or deps[ext]: continue
+            stat = path.stat()
+            if (stat.st_mtime_ns, stat.st_size) != (entry["mtime"], entry["size"]): continue
+            lazy[ext] = entry
+        return lazy
+
+    async def add_stubs(self, ext: str, entry: dict):
+        """
+        Registers placeholder commands which load the extension when one of them is used.
+        Commands from a cog are put in a LazyCog named after it.
+        """
+        by_cog: "dict[str | None, list[dict]]" = {}
+        for info in entry["commands"]:
+            by_cog.setdefault(info["cog"], []).append(info)
+
+        for cog_name, infos in by_cog.items():
+            if cog_name is None:
+                for info in infos:
+                    try:
+                        self.add_command(self._stub_command(ext, info))
+                    except commands.CommandRegistrationError:
+                        self.logger.warning(f'Could not add stub command {info["name"]} for {ext}, name is taken')
+                continue
+
+            stubs = [self._stub_command(ext, info) for info in infos]
+            try:
+                await self.add_cog(LazyCog(self, ext, infos[0], stubs))
+            except (discord.ClientException, commands.CommandRegistrationError):
+                self.logger.warning(f'Could not add stub cog {cog_name} for {ext}, a name is taken')
+        self.lazy_stubs[ext] = entry
+
+    def _stub_command(self, ext: str, info: dict) -> commands.Command:
+        # a callback of its own for every stub, so each can have its command's authors
+        if info["cog"] is None:
+            async def stub(ctx, *, _=None):
+                await self.load_lazy(ext, ctx)
+        else:
+            async def stub(cog, ctx, *, _=None):
+                await self.load_lazy(ext, ctx)
+        stub.AUTHORS = tuple(info["authors"])
+        # the only check a stub can have, extensions with any other are never lazy (see manifest_entry)
+        if info["owner_only"]: stub = commands.is_owner()(stub)
+
+        return commands.Command(
+            stub, name=info["name"], aliases=info["aliases"], help=info["help"], brief=info["brief"],
+            usage=info["usage"], hidden=info["hidden"], extras={"lazy_stub": ext}
+        )
+
+    async def remove_stubs(self, entry: dict):
+        for info in entry["commands"]:
+            if info["cog"] is not None:
+                if isinstance(self.get_cog(info["cog"]), LazyCog): await self.remove_cog(info["cog"])
+                continue
+            cmd = self.get_command(info["name"])
+            if cmd is not None and cmd.extras.get("lazy_stub"):
+                self.remove_command(info["name"])
+
+    async def load_lazy(self, ext: str, ctx: commands.Context):
+        """
+        Loads a lazy extension from one of its stub commands, then runs the real command
+        """
+        lock = self._lazy_locks.setdefault(ext, asyncio.Lock())
+        async with lock:
+            if ext not in self.extensions:
+                start = time.perf_counter()
+                await self.load_extension(ext)
+                self.logger.info(f'Lazily loaded module {ext} in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+        # parse the message again, now that the real command exists
+        await self.invoke(await self.get_context(ctx.message))
 
     async def start(self, token: str, *, reconnect: bool = True) -> None:
-        await self.load_dir("core")
-        await self.load_dir("cogs")
+        if self.ipc is not None:
+            await self.ipc.connect()
+
+        if self.config.lazy_cogs:
+            manifest = self.read_manifest()
+            lazy = self.find_lazy_modules("cogs", manifest)
+            await self.load_dirs("core", "cogs", skip=lazy)
+            for ext, entry in lazy.items():
+                await self.add_stubs(ext, entry)
+            self.write_manifest("cogs", manifest)
+            self.logger.info(f'Deferred loading of {len(lazy)} cogs until they are used')
+        else:
+            await self.load_dirs("core", "cogs")
 
         self.logger.info(f'Loaded {len(self.cogs)} cogs')
         return await super().start(token, reconnect=reconnect)
 
+    async def close(self) -> None:
+        await super().close()
+        if self.ipc is not None:
+            await self.ipc.close()
+
 # this code is ran if this py script is called in terminal
 # python3 bot.py
 if __name__ == '__main__':
+    sharding = load_config().sharding
 
-    # init bot, load token, activate discord
-    bot = CSClubBot()
-    with open(bot.config['token_file']) as token_file:
-        bot.run(token_file.read().splitlines()[0])
+    if sharding.processes > 1:
+        # split the shards over several processes
+        import cluster
+        cluster.run(sharding)
+    else:
+        # init bot, load token, activate discord
+        bot = CSClubBot(shard_count=sharding.shard_count)
+        bot.run(read_token(bot.config))
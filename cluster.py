@@ -0,0 +1,237 @@
+"""
+Runs the bot as several processes, each one connecting a slice of the shards.
+
+The processes talk to each other through a small hub in the parent process, over newline-separated
+JSON on localhost. A process can ask a question (e.g. "stats"), the hub asks every process
+(including the one that asked), and replies with the sum of all of the answers.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bot import ShardingConfig
+
+IPC_HOST = "127.0.0.1"
+COLLECT_TIMEOUT = 5
+
+logger = logging.getLogger('cluster')
+
+def _send(writer: asyncio.StreamWriter, msg: dict):
+    writer.write(json.dumps(msg).encode() + b"\n")
+
+def _sum_replies(replies: "list[dict]") -> dict:
+    totals = {"processes": len(replies)}
+    for reply in replies:
+        for k, v in reply.items():
+            totals[k] = totals.get(k, 0) + v
+    return totals
+
+class IPCHub:
+    """
+    Runs in the parent process, and passes questions from one worker to all of them
+    """
+    def __init__(self):
+        self.workers: "dict[int, asyncio.StreamWriter]" = {}
+        # collect id -> (replies so far, future that's set once every worker replied)
+        self._collecting: "dict[int, tuple[list[dict], asyncio.Future]]" = {}
+        self._ids = itertools.count()
+        # queries being answered, kept so they aren't garbage collected halfway
+        self._answering: "set[asyncio.Task]" = set()
+
+    async def serve(self, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self.handle, IPC_HOST, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        try:
+            async for line in reader:
+                try:
+                    worker = self.receive(json.loads(line), writer, worker)
+                except (ValueError, KeyError, TypeError) as e:
+                    # one bad message doesn't make the worker's connection any less usable
+                    logger.warning(f"Bad message from worker {worker}: {e!r}")
+        except ConnectionError as e:
+            logger.warning(f"Lost connection to worker {worker}: {e}")
+        except asyncio.CancelledError:
+            # the hub is shutting down
+            raise
+        finally:
+            if worker is not None:
+                self.workers.pop(worker, None)
+                # nothing's coming from this one anymore, so the others might be all that's left to wait for
+                self._check_done()
+            writer.close()
+
+    def receive(self, msg: dict, writer: asyncio.StreamWriter, worker: "int | None") -> "int | None":
+        """
+        Handles one message from a worker, returns which worker the connection is from (once it's said)
+        """
+        op = msg["op"]
+        if op == "hello":
+            worker = int(msg["worker"])
+            self.workers[worker] = writer
+        elif op == "query":
+            # check now, so a bad query is logged here rather than lost in the task answering it
+            if not {"id", "what"} <= msg.keys():
+                raise KeyError("query without an id or what")
+            task = asyncio.create_task(self.answer(writer, msg))
+            self._answering.add(task)
+            task.add_done_callback(self._answered)
+        elif op == "reply" and msg["id"] in self._collecting:
+            data = msg["data"]
+            if "error" in msg:
+                logger.warning(f"Worker {worker} couldn't answer: {msg['error']}")
+            self._collecting[msg["id"]][0].append(data)
+            self._check_done()
+        return worker
+
+    def _check_done(self):
+        for replies, done in self._collecting.values():
+            if len(replies) >= len(self.workers) and not done.done():
+                done.set_result(None)
+
+    async def collect(self, what: str) -> "list[dict]":
+        """
+        Asks every worker a question, and returns whatever answers come back in time
+        """
+        cid = next(self._ids)
+        replies, done = [], asyncio.get_running_loop().create_future()
+        self._collecting[cid] = (replies, done)
+
+        try:
+            for writer in list(self.workers.values()):
+                _send(writer, {"op": "collect", "id": cid, "what": what})
+            await asyncio.wait_for(done, COLLECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Only {len(replies)}/{len(self.workers)} workers answered {what!r}")
+        finally:
+            del self._collecting[cid]
+        return replies
+
+    async def answer(self, writer: asyncio.StreamWriter, msg: dict):
+        replies = await self.collect(msg["what"])
+        _send(writer, {"op": "reply", "id": msg["id"], "data": _sum_replies(replies)})
+
+    def _answered(self, task: asyncio.Task):
+        self._answering.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Couldn't answer a query", exc_info=task.exception())
+
+class IPCClient:
+    """
+    Runs in each worker. Answers the hub's questions using the functions in `handlers`,
+    and can ask questions of its own with `query`.
+    """
+    def __init__(self, worker: int, port: int):
+        self.worker = worker
+        self.port = port
+        self.handlers: "dict[str, Callable[[], dict]]" = {}
+
+        self._pending: "dict[int, asyncio.Future]" = {}
+        self._ids = itertools.count()
+        self._writer = None
+        self._reader_task = None
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_connection(IPC_HOST, self.port)
+        _send(self._writer, {"op": "hello", "worker": self.worker})
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def close(self):
+        if self._reader_task is not None: self._reader_task.cancel()
+        if self._writer is not None: self._writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        async for line in reader:
+            try:
+                self.receive(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                # dying here would leave every query after this one waiting forever
+                logger.warning(f"Bad message from the hub: {e!r}")
+
+    def receive(self, msg: dict):
+        if msg["op"] == "collect":
+            reply = {"op": "reply", "id": msg["id"], "data": {}}
+            handler = self.handlers.get(msg["what"])
+            try:
+                if handler is not None: reply["data"] = handler()
+            except Exception as e:
+                # still reply, so the hub isn't left waiting on this worker, and keep reading
+                logger.exception(f"Couldn't answer {msg['what']!r}")
+                reply["error"] = f"{type(e).__name__}: {e}"
+            _send(self._writer, reply)
+
+        elif msg["op"] == "reply":
+            future = self._pending.pop(msg["id"], None)
+            if future is not None and not future.done():
+                future.set_result(msg["data"])
+
+    async def query(self, what: str) -> dict:
+        """
+        Asks every worker a question, and gets the sum of their answers
+        (plus how many processes answered, under "processes")
+        """
+        qid = next(self._ids)
+        future = self._pending[qid] = asyncio.get_running_loop().create_future()
+        _send(self._writer, {"op": "query", "id": qid, "what": what})
+
+        try:
+            return await asyncio.wait_for(future, COLLECT_TIMEOUT * 2)
+        finally:
+            self._pending.pop(qid, None)
+
+def run_worker(worker: int, shard_ids: "list[int]", shard_count: int, port: int):
+    """
+    Entry point of each worker process
+    """
+    from bot import CSClubBot, read_token
+
+    bot = CSClubBot(shard_ids=shard_ids, shard_count=shard_count)
+    bot.ipc = IPCClient(worker, port)
+    bot.logger.info(f"Worker {worker} running shards {shard_ids} of {shard_count}")
+    bot.run(read_token(bot.config))
+
+def assign_shards(shard_count: int, processes: int) -> "list[list[int]]":
+    """
+    Splits the shards over the processes, each process getting every nth shard
+    """
+    if not 1 <= processes <= shard_count:
+        raise ValueError(f"can't split {shard_count} shards over {processes} processes")
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+async def supervise(sharding: "ShardingConfig"):
+    processes, shard_count, port = sharding.processes, sharding.shard_count, sharding.ipc_port
+    if shard_count is None:
+        raise ValueError("sharding.shard_count has to be set to run more than one process")
+    shards = assign_shards(shard_count, processes)
+
+    hub = IPCHub()
+    server = await hub.serve(port)
+
+    mp = multiprocessing.get_context("spawn")
+    workers = [
+        mp.Process(target=run_worker, args=(i, shard_ids, shard_count, port), name=f"naga-{i}")
+        for i, shard_ids in enumerate(shards)
+    ]
+    for w in workers:
+        w.start()
+
+    # if any worker stops (e.g. ]die), stop all of them, so the whole bot restarts together
+    loop = asyncio.get_running_loop()
+    joins = [loop.run_in_executor(None, w.join) for w in workers]
+    await asyncio.wait(joins, return_when=asyncio.FIRST_COMPLETED)
+    for w in workers:
+        if w.is_alive(): w.terminate()
+    await asyncio.gather(*joins)
+
+    server.close()
+    await server.wait_closed()
+
+def run(sharding: "ShardingConfig"):
+    logging.basicConfig(level=logging.INFO, format='[%(name)s %(levelname)s] %(message)s')
+    asyncio.run(supervise(sharding))
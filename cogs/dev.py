@@ -1,12 +1,125 @@
 import discord
 from discord.ext import commands
 
-import git
+import asyncio
+import io
+import random
 import sys
+import time
+from pathlib import PurePosixPath
 from enum import IntEnum
+from functools import cache
 from itertools import groupby, chain
 
-REPO = git.Repo() # this repo
+@cache
+def _repo():
+    """
+    This repo. GitPython is slow to import and set up, so that only happens the first time it's needed
+    """
+    import git
+    return git.Repo()
+
+def _read_version_info() -> "tuple[str, str, bool]":
+    """
+    (commit, branch, whether there are uncommitted changes) of this repo, runs git so keep it off the event loop
+    """
+    repo = _repo()
+    commit = repo.head.commit.hexsha[:10]
+    branch = "(detached)" if repo.head.is_detached else repo.active_branch.name
+    return commit, branch, repo.is_dirty()
+
+PROGRESS_EDIT_SECONDS = 1.5 # how often ]update's progress message is edited
+WATCH_POLL_SECONDS = 2 # how often extensions are checked for changes, if watch_extensions is on
+MAX_ERRORS_SHOWN = 25 # the most errors ]errors and ]errors top list at once
+EXTENSION_DIRS = ("core", "cogs")
+
+PLAIN_TYPES = (str, bytes, int, float, tuple, list, dict, set, frozenset)
+
+def _approx_size(obj) -> int:
+    """
+    Rough size in bytes of an object plus the plain values (strings, numbers, containers) it holds.
+    Other discord.py objects it points to are shared with the rest of the cache, so they aren't counted.
+    """
+    size = sys.getsizeof(obj)
+    slots = chain.from_iterable(getattr(cls, "__slots__", ()) for cls in type(obj).__mro__)
+    values = chain((getattr(obj, name, None) for name in slots), getattr(obj, "__dict__", {}).values())
+
+    for val in values:
+        if isinstance(val, PLAIN_TYPES):
+            size += sys.getsizeof(val)
+            if isinstance(val, dict): val = chain(val.keys(), val.values())
+            if not isinstance(val, (str, bytes, int, float)):
+                size += sum(sys.getsizeof(v) for v in val if isinstance(v, (str, bytes, int, float)))
+    return size
+
+def _avg_size(objs: list, samples=100) -> float:
+    if not objs: return 0
+    sample = random.sample(objs, min(samples, len(objs)))
+    return sum(map(_approx_size, sample)) / len(sample)
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024: return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+async def _git(*args) -> "tuple[int, str]":
+    """
+    Runs git without blocking the event loop, returns its exit code and output
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    out, _ = await proc.communicate()
+    return proc.returncode, out.decode(errors="replace").strip()
+
+def _full_name(ext: str) -> str:
+    # extensions can be given without their directory, those are in cogs
+    return ext if "." in ext else "cogs." + ext
+
+def _extension_of(path: PurePosixPath) -> "str | None":
+    """
+    The extension a Python file belongs to, if it's in one of EXTENSION_DIRS
+    """
+    if path.suffix != ".py" or path.parts[0] not in EXTENSION_DIRS: return None
+    # a file inside a package extension belongs to the package
+    parts = path.parts[:2] if len(path.parts) > 2 else path.with_suffix("").parts
+    return ".".join(parts) if parts[-1] != "__init__" else None
+
+def _changed_extensions(name_status: str) -> "tuple[list[str], list[str], list[str], list[str]]":
+    """
+    Splits the output of git diff --name-status into the extensions that were changed, added, and deleted,
+    and every other file (which might need a restart to take effect)
+    """
+    changed, added, deleted, others = {}, {}, {}, {}
+    for line in name_status.splitlines():
+        status, *paths = line.split("\t")
+        if not paths: continue
+        # a rename is the old file being deleted and the new one added
+        if status.startswith("R"): changes = [("D", paths[0]), ("A", paths[1])]
+        else: changes = [(status[:1], paths[-1])]
+
+        for status, path in changes:
+            path = PurePosixPath(path)
+            ext = _extension_of(path)
+            if ext is None: others[str(path)] = None
+            # adding or deleting a file inside a package only changes the package
+            elif len(path.parts) > 2 or status not in "AD": changed[ext] = None
+            elif status == "A": added[ext] = None
+            else: deleted[ext] = None
+    return list(changed), list(added), list(deleted), list(others)
+
+async def _send_block(ctx, lines, footer: str = ""):
+    """
+    Sends lines in a code block, split over as many messages as it takes to stay under discord's length limit
+    """
+    paginator = commands.Paginator(prefix="```", suffix="```", max_size=1900)
+    for line in lines:
+        paginator.add_line(line[:1800])
+    *pages, last = paginator.pages
+    for page in pages:
+        await ctx.send(page)
+    await ctx.send(f"{last}\n{footer}" if footer else last)
 
 class ExtStatus(IntEnum):
     LOAD_SUCCESS = 0,
@@ -21,11 +134,43 @@ class Developer(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self._watching = False
+        self._watcher = None
+        # cached result of _read_version_info, cleared by ]update
+        self._version_info = None
+
+    async def cog_load(self):
+        self._watching = True
+        self._watcher = asyncio.create_task(self.watch_extensions(), name="extension watcher")
+
+    async def cog_unload(self):
+        self._watching = False
+        # if the watcher is what's reloading this cog, cancelling it would stop the reload halfway.
+        # it stops by itself after this round instead
+        if asyncio.current_task() is not self._watcher:
+            self._watcher.cancel()
+
+    async def watch_extensions(self):
+        """
+        Dev mode: reloads extensions as soon as their files change, if watch_extensions is on in the config
+        """
+        # extension -> hash of the source that failed to load, so it isn't retried until it changes again
+        failed: "dict[str, str | None]" = {}
+
+        while self._watching:
+            await asyncio.sleep(WATCH_POLL_SECONDS)
+            if not self.bot.config.watch_extensions: continue
+
+            changed = {e: h for e, h in (await self.bot.changed_extensions()).items() if failed.get(e, 0) != h}
+            for status, name, e, took in await self.reload_timed(changed):
+                if status == ExtStatus.RELOAD_FAIL: failed[name] = changed[name]
+                else: failed.pop(name, None)
+                self.bot.logger.info("Watcher: %s %s in %.1fms", status.name.lower(), name, took * 1000)
 
     async def cog_check(self, ctx):
         if ctx.guild is not None:
             # if member has a developer role
-            roles = self.bot.config["dev_roles"].get(ctx.guild.id, None)
+            roles = self.bot.config.dev_roles.get(ctx.guild.id, None)
             if roles is not None and any(r.id in roles for r in ctx.author.roles):
                 return True
 
@@ -40,18 +185,58 @@ class Developer(commands.Cog):
     @commands.command(aliases=['git_pull'])
     async def update(self, ctx, *ext):
         """
-        Updates the bot from the GitHub repo
+        Updates the bot from the GitHub repo, and reloads whatever changed
         """
 
-        await ctx.send(':warning: Warning! Pulling from Git!')
-        await ctx.send(f'`Git` response: ```diff\n{REPO.git.pull()}```')
-        if ext:
-            await self.reload(ctx, *ext)
+        status = await ctx.send(':warning: Warning! Pulling from Git!')
+        _, old_head = await _git("rev-parse", "HEAD")
+
+        # stream git's progress into the status message while it pulls
+        proc = await asyncio.create_subprocess_exec(
+            "git", "pull", "--progress", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        raw, last_edit = [], time.monotonic()
+        while chunk := await proc.stdout.read(1024):
+            raw.append(chunk)
+            latest = chunk.decode(errors="replace").replace("\r", "\n").strip().splitlines()
+            if latest and time.monotonic() - last_edit > PROGRESS_EDIT_SECONDS:
+                last_edit = time.monotonic()
+                await status.edit(content=f':warning: Warning! Pulling from Git!\n`{latest[-1][:100]}`')
+        await proc.wait()
+
+        # progress lines are redrawn with \r, so only keep what each line ended up as
+        lines = [line.rsplit("\r", 1)[-1] for line in b"".join(raw).decode(errors="replace").strip().split("\n")]
+        await ctx.send(f'`Git` response: ```diff\n{chr(10).join(lines)[-1900:]}```')
+        self._version_info = None
+        if proc.returncode != 0: return
+
+        _, new_head = await _git("rev-parse", "HEAD")
+        if new_head == old_head:
+            changed, added, deleted, others = [], [], [], []
+        else:
+            _, diff = await _git("diff", "--name-status", old_head, new_head)
+            changed, added, deleted, others = _changed_extensions(diff)
+
+        # lazy extensions load whatever's on disk once they're used, so only loaded ones need reloading (new ones are loaded)
+        to_reload = [e for e in changed if e in self.bot.extensions]
+        to_reload += added
+        to_reload += [e for e in map(_full_name, ext) if e not in to_reload]
+        to_unload = [e for e in deleted if e in self.bot.extensions]
+        for e in deleted:
+            stubs = self.bot.lazy_stubs.pop(e, None)
+            if stubs is not None: await self.bot.remove_stubs(stubs)
+
+        if others:
+            await ctx.send(f"Changed outside of extensions, might need a restart: {', '.join(f'`{o}`' for o in others)}"[:2000])
+        if to_unload:
+            await self.unload(ctx, *to_unload)
+        if to_reload:
+            await self.reload(ctx, *to_reload)
 
     async def reload_ext(self, ext) -> "tuple[ExtStatus, str, Exception | None]":
         logger = self.bot.logger
         
-        if "." not in ext: ext = "cogs." + ext
+        ext = _full_name(ext)
         logger.info("Reloading %s", ext)
         try:
             await self.bot.reload_extension(ext)
@@ -67,7 +252,7 @@ class Developer(commands.Cog):
     async def load_ext(self, ext) -> "tuple[ExtStatus, str, Exception | None]":
         logger = self.bot.logger
         
-        if "." not in ext: ext = "cogs." + ext
+        ext = _full_name(ext)
         logger.info("Loading %s", ext)
         try:
             await self.bot.load_extension(ext)
@@ -81,7 +266,7 @@ class Developer(commands.Cog):
     async def unload_ext(self, ext) -> "tuple[ExtStatus, str, Exception | None]":
         logger = self.bot.logger
 
-        if "." not in ext: ext = "cogs." + ext
+        ext = _full_name(ext)
         logger.info("Unloading %s", ext)
         try:
             await self.bot.unload_extension(ext)
@@ -98,7 +283,8 @@ class Developer(commands.Cog):
         Reloads extensions
         """
 
-        attempts = [await self.reload_ext(e) for e in ext]
+        # each one only once, however it was named
+        attempts = [await self.reload_ext(e) for e in dict.fromkeys(map(_full_name, ext))]
         attempts = sorted(attempts, key=lambda t: t[0])
         statuses = dict((k, tuple(g)) for k, g in groupby(attempts, key=lambda t: t[0]))
         rs, rf, ls, lf = \
@@ -193,6 +379,35 @@ class Developer(commands.Cog):
 
         return await self.reload(ctx, *ctx.bot.extensions)
 
+    async def reload_timed(self, exts) -> "list[tuple[ExtStatus, str, Exception | None, float]]":
+        """
+        Reloads extensions one by one, returning how long each one took
+        """
+        results = []
+        for ext in exts:
+            start = time.perf_counter()
+            status, name, e = await self.reload_ext(ext)
+            results.append((status, name, e, time.perf_counter() - start))
+        return results
+
+    @reload.command(name='changed')
+    async def reload_changed(self, ctx):
+        """
+        Reloads only the extensions whose files changed since they were loaded
+        """
+        changed = await self.bot.changed_extensions()
+        if not changed:
+            return await ctx.send("No extensions changed.")
+
+        results = await self.reload_timed(changed)
+        ok = [f"`{name}` ({took * 1000:.1f}ms)" for _, name, e, took in results if e is None]
+        msg_lines = []
+        if ok: msg_lines += ['\N{OK HAND SIGN} Reloaded ' + ", ".join(ok), ""]
+        for _, name, e, _ in results:
+            if e is not None: msg_lines.append(f"Failed to load: `{name}`\n```py\n{e}\n```")
+
+        await ctx.send('\n'.join(msg_lines))
+
     @commands.command()
     @commands.is_owner()
     async def die(self, ctx):
@@ -205,16 +420,240 @@ class Developer(commands.Cog):
     @commands.command()
     async def version(self, ctx):
         """
-        Prints important version information about the bot's Python and discord.py installation
+        Prints important version information about the bot's Python and discord.py installation, and git commit
         """
+        if self._version_info is None:
+            try:
+                self._version_info = await asyncio.to_thread(_read_version_info)
+            except Exception as e:
+                self.bot.logger.warning("Couldn't read version info from git: %s", e)
+                self._version_info = ("?", "?", False)
+        commit, branch, dirty = self._version_info
+
         lines = (
             f"Python {sys.version}",
             "",
-            f"discord.py version: {discord.__version__}"
+            f"discord.py version: {discord.__version__}",
+            "",
+            f"Commit: {commit} on {branch}{' (with uncommitted changes)' if dirty else ''}"
         )
 
         await ctx.send("\n".join(lines))
     
+    @commands.group(invoke_without_command=True)
+    async def stats(self, ctx):
+        """
+        Shows how many guilds, members, and channels the bot can see
+        """
+        stats = getattr(self.bot, "stats", None)
+        if stats is None:
+            return await ctx.send("`core.stats` isn't loaded.")
+
+        totals = await stats.totals()
+        lines = (
+            f"Guilds  : {totals['guilds']}",
+            f"Members : {totals['members']}",
+            f"Channels: {totals['channels']}",
+            f"({totals['processes']} process{'es' if totals['processes'] != 1 else ''})"
+        )
+        await _send_block(ctx, lines)
+
+    @stats.command(name="poll")
+    async def stats_poll(self, ctx):
+        """
+        Shows how well the poll reaction cache is doing
+        """
+        poll = self.bot.get_cog("Poll")
+        if poll is None:
+            return await ctx.send("The poll cog isn't loaded.")
+
+        cache = poll.parse_cache
+        total = cache.hits + cache.misses
+        lines = (
+            f"Entries: {len(cache.entries)}/{cache.maxsize}",
+            f"Hits   : {cache.hits}",
+            f"Misses : {cache.misses}",
+            f"Hit rate: {cache.hits / total:.1%}" if total else "Hit rate: -"
+        )
+        await _send_block(ctx, lines)
+
+    @stats.command(name="commands")
+    async def stats_commands(self, ctx):
+        """
+        Shows how often each command was used, how often it failed, and how long it takes
+        """
+        metrics = getattr(self.bot, "metrics", None)
+        if metrics is None:
+            return await ctx.send("`core.metrics` isn't loaded.")
+        if not metrics.commands:
+            return await ctx.send("No commands used yet!")
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.0f}" if seconds != float("inf") else "inf"
+
+        # medians per phase, p95 of the whole thing. buckets are coarse, so these are upper bounds
+        lines = [f"{'Command':<16} {'Uses':>5} {'Errs':>5} {'Parse':>6} {'Checks':>6} {'Call':>6} {'Send':>6} {'p95':>6}"]
+        for name, s in sorted(metrics.commands.items(), key=lambda t: -t[1].invocations):
+            phases = (ms(s.phases[p].quantile(0.5)) for p in ("parse", "checks", "callback", "send"))
+            lines.append(f"{name[:16]:<16} {s.invocations:>5} {s.errors:>5} " + " ".join(f"{p:>6}" for p in phases) + \
+                         f" {ms(s.total.quantile(0.95)):>6}")
+
+        for name, hist in metrics.timings.items():
+            lines.append(f"{name}: {hist.count} times, median {ms(hist.quantile(0.5))}ms, p95 {ms(hist.quantile(0.95))}ms")
+        await _send_block(ctx, lines, "(times in ms)")
+
+    @commands.command()
+    async def footprint(self, ctx):
+        """
+        Estimates how much memory the member & message caches would take under each config profile
+        """
+        bot = self.bot
+        members = [m for g in bot.guilds for m in g.members]
+        messages = list(bot.cached_messages)
+        member_size, message_size = _avg_size(members), _avg_size(messages)
+
+        all_members = sum(g.member_count or 0 for g in bot.guilds)
+        voice_members = sum(len(c.voice_states) for g in bot.guilds for c in g.voice_channels)
+
+        lines = [f"{'Profile':<15} {'Members':>20} {'Messages':>20} {'Total':>10}"]
+        for name, profile in bot.profiles.items():
+            cache, intents = profile["member_cache_flags"], profile["intents"]
+
+            # members that joined after startup only show up over time, so that's an upper bound (~)
+            if not intents.members: n_members, approx = 0, ""
+            elif cache.joined: n_members, approx = all_members, "" if profile["chunk_guilds_at_startup"] else "~"
+            elif cache.voice: n_members, approx = voice_members, ""
+            else: n_members, approx = 0, ""
+            n_messages = profile["max_messages"] or 0
+
+            mem_bytes, msg_bytes = n_members * member_size, n_messages * message_size
+            cols = (
+                f"{approx}{n_members} ({_fmt_bytes(mem_bytes)})",
+                f"{n_messages} ({_fmt_bytes(msg_bytes)})",
+                _fmt_bytes(mem_bytes + msg_bytes)
+            )
+            marker = "*" if name == bot.profile else " "
+            lines.append(f"{marker}{name:<14} {cols[0]:>20} {cols[1]:>20} {cols[2]:>10}")
+
+        lines += [
+            "",
+            f"Now: {len(members)} members (~{_fmt_bytes(member_size)} each), " \
+            f"{len(messages)} messages (~{_fmt_bytes(message_size)} each)"
+        ]
+        await ctx.send("```\n{}\n```".format("\n".join(lines)))
+
+    @commands.group(invoke_without_command=True)
+    async def errors(self, ctx, count: int = 10):
+        """
+        Lists the most recent errors
+        """
+        log = getattr(self.bot, "error_log", None)
+        if log is None:
+            return await ctx.send("`core.error` isn't loaded.")
+        if not log.recent:
+            return await ctx.send("No errors yet!")
+
+        now = time.time()
+        records = list(log.recent)[-max(1, min(count, MAX_ERRORS_SHOWN)):]
+        lines = [
+            f"{len(log.recent) - len(records) + i:>3}  {now - r.timestamp:>6.0f}s ago  {r.command:<15} {r.summary[:80]}"
+            for i, r in enumerate(records)
+        ]
+        await _send_block(ctx, lines, f"`{ctx.clean_prefix}errors show <#>` for a traceback")
+
+    @errors.command(name="show")
+    async def errors_show(self, ctx, index: int = -1):
+        """
+        Sends the traceback of one of the recent errors (the latest one by default)
+        """
+        log = getattr(self.bot, "error_log", None)
+        if log is None:
+            return await ctx.send("`core.error` isn't loaded.")
+        try:
+            record = log.recent[index]
+        except IndexError:
+            return await ctx.send(f"There are only {len(log.recent)} errors.")
+
+        where = f"guild {record.guild_id}" if record.guild_id else "DMs"
+        await ctx.send(f"`{record.command}` in {where}: {record.summary[:1500]}",
+                       file=discord.File(io.StringIO(record.traceback), "traceback.txt"))
+
+    @errors.command(name="top")
+    async def errors_top(self, ctx, count: int = 10):
+        """
+        Lists the errors that happened the most, by where they were raised
+        """
+        log = getattr(self.bot, "error_log", None)
+        if log is None:
+            return await ctx.send("`core.error` isn't loaded.")
+        if not log.fingerprints:
+            return await ctx.send("No errors yet!")
+
+        lines = [
+            f"{n:>5}  {exc_type} at {filename.rsplit('/', 1)[-1]}:{lineno} ({func})"
+            for (exc_type, filename, lineno, func), n in log.fingerprints.most_common(max(1, min(count, MAX_ERRORS_SHOWN)))
+        ]
+        await _send_block(ctx, lines)
+
+    @errors.command(name="rates")
+    async def errors_rates(self, ctx):
+        """
+        Lists how often each command fails
+        """
+        log = getattr(self.bot, "error_log", None)
+        if log is None:
+            return await ctx.send("`core.error` isn't loaded.")
+        if not log.errors:
+            return await ctx.send("No errors yet!")
+
+        lines = [f"{'Command':<20} {'Errors':>7} {'Uses':>7} {'Rate':>7}"]
+        for cmd, n, uses in log.rates():
+            rate = f"{n / uses:.1%}" if uses else "-"
+            lines.append(f"{cmd:<20} {n:>7} {uses:>7} {rate:>7}")
+        await _send_block(ctx, lines)
+
+    @commands.group(invoke_without_command=True)
+    async def lag(self, ctx):
+        """
+        Shows how far behind the event loop has been, and what recently blocked it
+        """
+        watchdog = getattr(self.bot, "watchdog", None)
+        if watchdog is None:
+            return await ctx.send("`core.watchdog` isn't loaded.")
+
+        samples = list(watchdog.samples)
+        lines = [
+            f"Now    : {samples[-1] * 1000:.1f}ms" if samples else "Now    : -",
+            f"Average: {sum(samples) / len(samples) * 1000:.1f}ms (last {len(samples)} ticks)" if samples else "Average: -",
+            f"Worst  : {watchdog.max_lag * 1000:.1f}ms",
+            "",
+        ]
+        now = time.time()
+        stalls = list(watchdog.stalls)[-10:]
+        if stalls:
+            lines.append("Recent stalls:")
+            for i, stall in enumerate(stalls, len(watchdog.stalls) - len(stalls)):
+                lines.append(f"{i:>3}  {now - stall.started:>6.0f}s ago  {stall.duration * 1000:>6.0f}ms  {stall.task}")
+        else:
+            lines.append("No stalls yet!")
+        await ctx.send("```\n{}\n```\n`{}lag show <#>` for a stack".format("\n".join(lines), ctx.clean_prefix))
+
+    @lag.command(name="show")
+    async def lag_show(self, ctx, index: int = -1):
+        """
+        Sends the stack of what was running during one of the recent stalls (the latest one by default)
+        """
+        watchdog = getattr(self.bot, "watchdog", None)
+        if watchdog is None:
+            return await ctx.send("`core.watchdog` isn't loaded.")
+        try:
+            stall = watchdog.stalls[index]
+        except IndexError:
+            return await ctx.send(f"There are only {len(watchdog.stalls)} stalls.")
+
+        await ctx.send(f"Blocked for {stall.duration * 1000:.0f}ms by `{stall.task}`",
+                       file=discord.File(io.StringIO(stall.format_stack()), "stack.txt"))
+
     @commands.command()
     async def crash(self, ctx):
         """
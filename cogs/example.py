@@ -7,6 +7,10 @@ from discord.ext import commands
 
 import random
 
+# if this cog needs another extension to be loaded first, list it here.
+# extensions without dependencies on each other are loaded at the same time, so only list what you actually need!
+# DEPENDENCIES = ("cogs.poll", )
+
 # the class name should be the name of the category
 # it should extend the commands.Cog class
 class Example(commands.Cog):
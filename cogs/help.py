@@ -3,11 +3,41 @@ from discord.ext import commands
 from collections.abc import Collection
 import itertools
 
+from core.suggest import category_name
+
+# authors come from bot.authors, suggestions for unknown commands from bot.suggestions
+DEPENDENCIES = ("core.authors", "core.suggest")
+
+class HelpIndex:
+    """
+    Every category, and every help page that's been rendered so far.
+    Only valid for one cog_generation of the bot (and one version of its authors), after that it's rebuilt from scratch.
+    """
+    __slots__ = ("generation", "authors_version", "categories", "lower", "pages")
+
+    def __init__(self, bot: commands.Bot, category_name):
+        self.generation = bot.cog_generation
+        # pages show the authors' mentions, which change if an author turns out not to exist
+        self.authors_version = bot.authors.version
+        # category name -> cogs in it
+        self.categories: "dict[str, tuple[commands.Cog]]" = {}
+        for cog in bot.cogs.values():
+            cat = category_name(cog)
+            self.categories[cat] = (*self.categories.get(cat, ()), cog)
+        # lowercase category name -> category name
+        self.lower = {cat.lower(): cat for cat in self.categories}
+
+        # (kind, name, prefix, invoked with) -> rendered pages
+        self.pages: "dict[tuple, list[str]]" = {}
+
 class CSClubBotHelp(commands.MinimalHelpCommand):
 
     ### BOT HELP ###
 
     async def send_bot_help(self, mapping):
+        await self.send_cached(("bot", None), self.render_bot_help)
+
+    def render_bot_help(self):
         # force Misc at the end, sort rest by alphabetical
         cats = sorted(self.get_categories(), key=lambda k: (k == "Misc", k))
 
@@ -20,7 +50,6 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
             self.paginator.add_line(f"`{cats[-1]}`")
 
         self.add_ending_note()
-        await self.send_pages()
 
     def get_ending_note(self):
         return '`{0}{1} <command>` for in-depth help for a command\n' \
@@ -46,6 +75,9 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
             else:
                 return await self.send_command_help(cmds[0])
 
+        await self.send_cached(("category", cat), lambda: self.render_category_help(cat, cogs, cmds))
+
+    def render_category_help(self, cat: str, cogs: "tuple[commands.Cog]", cmds: "list[commands.Command]"):
         self.paginator.add_line(f"**{cat} commands:**")
         
         # add authors
@@ -53,14 +85,13 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
         for cog in cogs:
             authors += self.get_authors(cog)
         if authors:
-            self.paginator.add_line("*Authored by* " + ", ".join(map(lambda a: a.mention, authors)))
+            self.paginator.add_line("*Authored by* " + ", ".join(dict.fromkeys(authors)))
         self.paginator.add_line()
 
         #self.add_desc(cog)
         self.add_subcommand_list(sorted(cmds, key=lambda c: c.name))
 
         self.add_ending_note()
-        await self.send_pages()
 
     def add_subcommand_formatting(self, command, cell=0):
         # formats commands within groups (cmds w/ subcommands) or categories
@@ -81,50 +112,42 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
 
     ### CATEGORY UTIL ###
 
-    def get_categories(self) -> "set[str]":
+    @property
+    def index(self) -> HelpIndex:
+        return self.cog.get_index(self.context.bot, self.category_name)
+
+    def get_categories(self) -> "Collection[str]":
         """
         List of every category name out of the registered cogs in the bot.
         """
-        return set(self.category_name(cog) for cog in self.context.bot.cogs.values())
+        return self.index.categories.keys()
     
     def category_name(self, cog: commands.Cog) -> str:
         """
-        Normally, the category name is just the qualified name of the cog, but it can be overrided
-        by adding a HELP_CATEGORY attribute. Multiple cogs with the same category will be merged into 
-        one category in help.
+        See core.suggest.category_name, which suggestions share
         """
-        if hasattr(cog, "HELP_CATEGORY"): return cog.HELP_CATEGORY
-        else: return cog.qualified_name
+        return category_name(cog)
 
     def cogs_in_category(self, cat: str) -> "tuple[commands.Cog]":
         """
         Gets all registered cogs that have the specified category name
         """
-        cogs = self.context.bot.cogs.values()
-        return tuple(cog for cog in cogs if self.category_name(cog) == cat)
+        return self.index.categories.get(cat, ())
 
     ### AUTHOR UTIL ###
 
-    def get_authors(self, c: "commands.Command | commands.Cog") -> "tuple[discord.User]":
-        authors = []
-
-        if isinstance(c, commands.Cog):
-            if hasattr(c, "AUTHORS"): pot_authors = c.AUTHORS
-            elif hasattr(c, "AUTHOR"): pot_authors = c.AUTHOR
-            else: pot_authors = []
-
-            if isinstance(pot_authors, int): authors.append(pot_authors)
-            elif isinstance(pot_authors, Collection): authors.extend(pot_authors)
-        
-        elif isinstance(c, commands.Command):
-            authors.extend(a.id for a in self.get_authors(c.cog)) # TODO cmd author sys
-
-        auth_users = [self.context.bot.get_user(aid) for aid in authors if isinstance(aid, int)]
-        return tuple(filter(lambda u: u is not None, auth_users))
+    def get_authors(self, c: "commands.Command | commands.Cog") -> "list[str]":
+        """
+        Mentions of whoever wrote a command or cog (see core.authors)
+        """
+        return self.context.bot.authors.mentions(c)
 
     ### COMMAND/GROUP HELP ###
 
     async def send_command_help(self, command):
+        await self.send_cached(("command", command.qualified_name), lambda: self.render_command_help(command))
+
+    def render_command_help(self, command: commands.Command):
         self.add_command_heading(command)
         self.add_description(command)
 
@@ -152,10 +175,9 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
         # add authors
         authors = self.get_authors(command)
         if authors:
-            self.paginator.add_line("*Authored by* " + ", ".join(map(lambda a: a.mention, authors)))
+            self.paginator.add_line("*Authored by* " + ", ".join(authors))
 
         self.paginator.close_page()
-        await self.send_pages()
 
     def add_command_heading(self, command: commands.Command):
         """
@@ -182,9 +204,35 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
                     self.paginator.add_line(line)
                 self.paginator.add_line()
 
+    ### NOT FOUND ###
+
+    async def command_not_found(self, string: str) -> str:
+        return super().command_not_found(string) + \
+               await self.context.bot.suggestions.did_you_mean(self.context, string)
+
+    async def subcommand_not_found(self, command: commands.Command, string: str) -> str:
+        msg = super().subcommand_not_found(command, string)
+        if isinstance(command, commands.Group):
+            msg += await self.context.bot.suggestions.did_you_mean(self.context, f"{command.qualified_name} {string}")
+        return msg
+
     ### MISC ###
 
-    async def send_pages(self):
+    async def send_cached(self, key: tuple, render):
+        """
+        Sends a help page, rendering it into the index first if it isn't there yet.
+        Pages only depend on the cogs loaded, and the prefix & name help was called with.
+        """
+        index = self.index
+        key = (*key, self.context.clean_prefix, self.invoked_with)
+
+        pages = index.pages.get(key)
+        if pages is None:
+            render()
+            pages = index.pages[key] = self.paginator.pages
+        await self.send_pages(pages)
+
+    async def send_pages(self, pages: "list[str] | None" = None):
         """
         A helper utility to send the page output from :attr:`paginator` to the destination.
         """
@@ -192,7 +240,7 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
         # copied from d.py
 
         destination = self.get_destination()
-        for page in self.paginator.pages:
+        for page in pages if pages is not None else self.paginator.pages:
             # make sure it does NOT ping anyone ever
             await destination.send(page, allowed_mentions=discord.AllowedMentions.none())
 
@@ -238,7 +286,7 @@ class CSClubBotHelp(commands.MinimalHelpCommand):
         cmd = bot.all_commands.get(keys[0])
         if cmd is None:
             # *If it's not a command, check it's a category
-            cat_match = next((c for c in self.get_categories() if c.lower() == command.lower()), None)
+            cat_match = self.index.lower.get(command.lower())
 
             if cat_match is not None:
                 return await self.send_category_help(cat_match)
@@ -267,6 +315,16 @@ class Help(commands.Cog):
     HELP_CATEGORY = "Misc"
     AUTHORS = (141294044671246337,)
 
+    def __init__(self):
+        # the help command is copied for every use, so the index is kept here instead
+        self.index: "HelpIndex | None" = None
+
+    def get_index(self, bot: commands.Bot, category_name) -> HelpIndex:
+        if self.index is None or self.index.generation != bot.cog_generation \
+                or self.index.authors_version != bot.authors.version:
+            self.index = HelpIndex(bot, category_name)
+        return self.index
+
 async def setup(bot):
     helpcog = Help()
     await bot.add_cog(helpcog)
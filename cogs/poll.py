@@ -1,41 +1,245 @@
 import discord
 from discord.ext import commands
 
-import emoji
+import asyncio
+import csv
+import importlib.metadata
 import inspect
-import re
+import io
+import json
+import os
+import sqlite3
 import string
+import tempfile
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from pathlib import Path
 
 ### MATCHES ###
-# match any custom emoji, "custom" is set to the ID of the matched emoji
-CUSTOM_EMOJI_REGEX = r"(?:<a?:\w+?:(?P<custom>\d+)>)"
-# match any custom emoji the user cannot access (e.g. :hello: not appearing), "pcustname" is set to the name of the matched emoji
-PC_EMOJI_REGEX = r"(?::(?P<pcustname>\w+?):)"
-
-# match any unicode emoji, "emoji" is set to the matched emote
-# any \uFE0F is also captured to heed by discord's emote stuff
-_all_unicode_emoji = emoji.get_emoji_regexp().pattern + r"|[\U0001F1E6-\U0001F1FF]"
-UNI_EMOJI_REGEX = r"(?P<emoji>(?:{})\uFE0F*)".format(_all_unicode_emoji)
-
-# capture everything else (under name "misc")
-# if matched character is in EMO_MAP, use that emoji
-LINE_MISC_REGEX = r"(?P<misc>10|.)"
-MISC_REGEX = r"(?P<misc>.)" 
-
-# match ranges
-# examples: 1..5, 2-9, A-F, Q..Z
-# "nrange" or "arange" matches full range
-# "nL" or "aL" matches left bound (inclusive)
-# "nR" or "aR" matches right bound (inclusive)
-NUM_RANGE_REGEX = r"(?P<nrange>(?P<nL>10|\d)(?:-|\.\.)(?P<nR>10|\d))" # numeric range, 0..10 or 0-10
-ALPHA_RANGE_REGEX = r"(?P<arange>(?P<aL>[A-Za-z])(?:-|\.\.)(?P<aR>[A-Za-z]))" # alphabetic range, a..z or a-z
-
-_raw_emoji_regex = f"{CUSTOM_EMOJI_REGEX}|{PC_EMOJI_REGEX}|{UNI_EMOJI_REGEX}"
-
-# all regexes that can be matched with the default ]poll <rxns> <msg> setting
-EMOJI_REGEX = re.compile(f"{NUM_RANGE_REGEX}|{ALPHA_RANGE_REGEX}|{_raw_emoji_regex}|{MISC_REGEX}")
-# all regexes that can be matched with the  ]poll lines <msg> setting
-LINE_REGEX = re.compile(f"^(?:{UNI_EMOJI_REGEX})", re.M)
+# poll reactions are split into tokens, each one of these kinds:
+# "nrange"    numeric range, 0..10 or 0-10 (left & right bounds are inclusive)
+# "arange"    alphabetic range, a..z or a-z
+# "custom"    any custom emoji, <:name:id> or <a:name:id>, the token is the ID of the emoji
+# "pcustname" any custom emoji the user cannot access (e.g. :hello: not appearing), the token is the name
+# "emoji"     any unicode emoji. any \uFE0F after it is also captured to heed by discord's emote stuff
+# "misc"      any other character (except newlines). if it's in EMO_MAP, that emoji is used
+
+# ]poll <rxns> <msg> reads every token, ]poll lines <msg> only reads the unicode emoji at the start of each line
+EMOJI_MODE = "emoji"
+LINE_MODE = "lines"
+
+# regional indicators on their own (flags are already in the emoji list)
+REGIONAL_INDICATORS = [chr(c) for c in range(0x1F1E6, 0x1F1FF + 1)]
+
+# the emoji trie is built once per version of the emoji package, and saved here
+TRIE_CACHE_DIR = Path("cache")
+TRIE_FORMAT = 3
+
+def _unicode_emoji() -> "list[str]":
+    # only needed when (re)building the trie, and the emoji package is slow to import
+    import emoji
+
+    # emoji >= 1.7 has every emoji in EMOJI_DATA, older versions only have them by language
+    if hasattr(emoji, "EMOJI_DATA"): return list(emoji.EMOJI_DATA)
+    return list(emoji.UNICODE_EMOJI_ENGLISH)
+
+def _is_word(c: str) -> bool:
+    # same as \w
+    return c.isalnum() or c == "_"
+
+class EmojiTokenizer:
+    """
+    Splits poll reactions into tokens. 
+
+    Unicode emoji are found with a trie over their codepoints, always taking the longest emoji
+    that matches. The other kinds of tokens are checked by hand, in the order they're listed above.
+    """
+    END = "" # key of nodes where an emoji ends, can't clash with a codepoint
+
+    def __init__(self, trie: dict):
+        self.trie = trie
+
+    @classmethod
+    def from_emojis(cls, emojis: "list[str]") -> "EmojiTokenizer":
+        trie = {}
+        for e in emojis:
+            node = trie
+            for c in e:
+                node = node.setdefault(c, {})
+            node[cls.END] = True
+        return cls(trie)
+
+    def match_emoji(self, s: str, i: int) -> int:
+        """
+        Finds the longest unicode emoji (plus any \uFE0F) starting at s[i], returns where it ends or -1
+        """
+        node, end, n = self.trie, -1, len(s)
+        for j in range(i, n):
+            node = node.get(s[j])
+            if node is None: break
+            if self.END in node: end = j + 1
+
+        if end != -1:
+            while end < n and s[end] == "\uFE0F": end += 1
+        return end
+
+    @staticmethod
+    def match_num_range(s: str, i: int) -> "tuple[str, str, int] | None":
+        # a bound is 10 or a digit, 10 is tried first
+        for left in ("10" if s.startswith("10", i) else None, s[i] if s[i].isdecimal() else None):
+            if left is None: continue
+
+            j = i + len(left)
+            if s.startswith("-", j): j += 1
+            elif s.startswith("..", j): j += 2
+            else: continue
+
+            if s.startswith("10", j): right = "10"
+            elif j < len(s) and s[j].isdecimal(): right = s[j]
+            else: continue
+            return left, right, j + len(right)
+        return None
+
+    @staticmethod
+    def match_alpha_range(s: str, i: int) -> "tuple[str, str, int] | None":
+        if s[i] not in string.ascii_letters: return None
+
+        j = i + 1
+        if s.startswith("-", j): j += 1
+        elif s.startswith("..", j): j += 2
+        else: return None
+
+        if j < len(s) and s[j] in string.ascii_letters:
+            return s[i], s[j], j + 1
+        return None
+
+    @staticmethod
+    def match_name(s: str, i: int) -> int:
+        """
+        Matches ":name:" at s[i], returns where the name ends (the second colon) or -1
+        """
+        if not s.startswith(":", i): return -1
+        j = i + 1
+        while j < len(s) and _is_word(s[j]): j += 1
+        return j if j > i + 1 and s.startswith(":", j) else -1
+
+    def match_custom(self, s: str, i: int) -> "tuple[str, int] | None":
+        # <:name:id> or <a:name:id>
+        if s[i] != "<": return None
+        j = i + 2 if s.startswith("a", i + 1) else i + 1
+
+        j = self.match_name(s, j)
+        if j == -1: return None
+
+        k = j + 1
+        while k < len(s) and s[k].isdecimal(): k += 1
+        if k > j + 1 and s.startswith(">", k):
+            return s[j + 1:k], k + 1
+        return None
+
+    def tokens(self, s: str, mode: str = EMOJI_MODE):
+        """
+        Yields (kind, token, left bound, right bound) for every token in s. The bounds are only set for ranges.
+        """
+        if mode == LINE_MODE:
+            yield from self.line_tokens(s)
+            return
+
+        i, n = 0, len(s)
+        while i < n:
+            c = s[i]
+
+            rng = self.match_num_range(s, i)
+            if rng is not None:
+                left, right, end = rng
+                yield "nrange", s[i:end], left, right
+                i = end
+                continue
+
+            rng = self.match_alpha_range(s, i)
+            if rng is not None:
+                left, right, end = rng
+                yield "arange", s[i:end], left, right
+                i = end
+                continue
+
+            if c == "<":
+                custom = self.match_custom(s, i)
+                if custom is not None:
+                    yield "custom", custom[0], None, None
+                    i = custom[1]
+                    continue
+
+            if c == ":":
+                end = self.match_name(s, i)
+                if end != -1:
+                    yield "pcustname", s[i + 1:end], None, None
+                    i = end + 1
+                    continue
+
+            end = self.match_emoji(s, i)
+            if end != -1:
+                yield "emoji", s[i:end], None, None
+                i = end
+                continue
+
+            if c != "\n":
+                yield "misc", c, None, None
+            i += 1
+
+    def line_tokens(self, s: str):
+        i = 0
+        while i != -1:
+            end = self.match_emoji(s, i)
+            if end != -1:
+                yield "emoji", s[i:end], None, None
+
+            # emoji never have newlines, so the next line always starts after the next newline
+            i = s.find("\n", i)
+            if i != -1: i += 1
+
+def _load_tokenizer() -> EmojiTokenizer:
+    """
+    Loads the emoji trie saved for the installed version of the emoji package,
+    or builds (and saves) it if there isn't one yet
+    """
+    try:
+        version = importlib.metadata.version("emoji")
+    except importlib.metadata.PackageNotFoundError:
+        import emoji
+        version = emoji.__version__
+    path = TRIE_CACHE_DIR / f"emoji_trie-{version}-{TRIE_FORMAT}.json"
+
+    try:
+        # plain JSON, so loading the file can only ever give back data, never run anything
+        with open(path, encoding="utf-8") as trie_file:
+            saved = json.load(trie_file)
+        # but a mangled (or hand-edited) file can still hold the wrong data
+        if isinstance(saved, dict) and saved.get("version") == version and saved.get("format") == TRIE_FORMAT \
+                and isinstance(saved.get("trie"), dict):
+            return EmojiTokenizer(saved["trie"])
+    except Exception:
+        pass # anything wrong with the file just means building the trie again
+
+    tokenizer = EmojiTokenizer.from_emojis(_unicode_emoji() + REGIONAL_INDICATORS)
+    try:
+        TRIE_CACHE_DIR.mkdir(exist_ok=True)
+        # write it somewhere else first, so another process never reads half a file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as trie_file:
+            saved = {"version": version, "format": TRIE_FORMAT, "trie": tokenizer.trie}
+            json.dump(saved, trie_file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+        # the tries of any other emoji version (or older format) won't be used again
+        for old in [*TRIE_CACHE_DIR.glob("emoji_trie-*.json"), *TRIE_CACHE_DIR.glob("emoji_trie-*.pickle")]:
+            if old != path: old.unlink()
+    except OSError:
+        pass # not being able to save the trie just means building it again next time
+    return tokenizer
+
+TOKENIZER = _load_tokenizer()
 BLANK_TEXT = "** **"
 
 EMO_MAP = {}
@@ -57,6 +261,13 @@ EMO_MAP.update({
 })
 
 EMOJI_CAP = 20
+PARSE_CACHE_SIZE = 256
+TALLY_FLUSH_SECONDS = 10
+TALLY_MAX_AGE = 30 * 24 * 60 * 60 # seconds, older polls stop counting votes (their results are still saved)
+EXPORT_PAGE_SIZE = 100 # the most discord gives per request
+EXPORT_CONCURRENCY = 4
+EXPORT_COOLDOWN = 60 # seconds between exports in a guild, each one can take thousands of requests
+MAX_RXN_RETRIES = 3
 
 # aliases = "\n".join([
 #     "",
@@ -80,6 +291,412 @@ EMOJI_CAP = 20
 def add_aliases(doc):
     return inspect.cleandoc(doc)
 
+### REACTIONS ###
+
+class ReactionScheduler:
+    """
+    Adds reactions to several messages at once, keeping the order of the reactions on each message.
+
+    Discord rate limits reactions per channel, so all messages in a channel share a bucket:
+    if one of them gets rate limited, every message in that channel waits it out.
+    """
+
+    def __init__(self):
+        # channel id -> time.monotonic() when the channel can be reacted in again
+        self.resume_at: "dict[int, float]" = {}
+
+    async def _wait_for(self, bucket: int):
+        # another message in the channel might get rate limited again while this one waits
+        while (delay := self.resume_at.get(bucket, 0) - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        # expired, so forget it, otherwise every channel ever rate limited stays in here
+        self.resume_at.pop(bucket, None)
+
+    def _back_off(self, bucket: int, delay: float):
+        self.resume_at[bucket] = max(self.resume_at.get(bucket, 0), time.monotonic() + delay)
+
+    async def react(self, msg: discord.Message, rxns) -> int:
+        """
+        Adds reactions to one message in order, returns how many failed
+        """
+        bucket = msg.channel.id
+        failed = 0
+
+        for rxn in rxns:
+            for _ in range(MAX_RXN_RETRIES + 1):
+                await self._wait_for(bucket)
+                try:
+                    await msg.add_reaction(rxn)
+                    break
+                except discord.RateLimited as e:
+                    self._back_off(bucket, e.retry_after)
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        failed += 1
+                        break
+                    self._back_off(bucket, float(e.response.headers.get("Retry-After", 1)))
+                except Exception:
+                    # bad emoji, etc.
+                    failed += 1
+                    break
+            else:
+                failed += 1
+
+        return failed
+
+    async def react_all(self, plan: "list[tuple[discord.Message, list]]") -> int:
+        """
+        Adds each list of reactions to its message, all messages at the same time.
+        Returns how many reactions failed.
+        """
+        return sum(await asyncio.gather(*(self.react(msg, rxns) for msg, rxns in plan)))
+
+REACTIONS = ReactionScheduler()
+
+### CUSTOM EMOJI ###
+
+def _index_emojis(emojis) -> "tuple[dict[str, discord.Emoji], dict[int, discord.Emoji]]":
+    """
+    Name -> emoji and ID -> emoji lookups. If two emoji share a name, the first one wins.
+    """
+    by_name, by_id = {}, {}
+    for e in emojis:
+        by_name.setdefault(e.name, e)
+        by_id[e.id] = e
+    return by_name, by_id
+
+class GuildEmojiIndex:
+    """
+    Lookups for the custom emoji of each guild, built the first time a guild is used,
+    and rebuilt whenever the guild's emoji change
+    """
+
+    def __init__(self):
+        self.guilds: "dict[int, tuple[dict[str, discord.Emoji], dict[int, discord.Emoji]]]" = {}
+        # bumped every time a guild's emoji change, so anything parsed with the old emoji can be told apart
+        self.versions: "dict[int, int]" = {}
+
+    def get(self, guild: discord.Guild) -> "tuple[dict[str, discord.Emoji], dict[int, discord.Emoji]]":
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.guilds[guild.id] = _index_emojis(guild.emojis)
+        return index
+
+    def update(self, guild: discord.Guild, emojis):
+        self.guilds[guild.id] = _index_emojis(emojis)
+        self.versions[guild.id] = self.versions.get(guild.id, 0) + 1
+
+    def version(self, guild: "discord.Guild | None") -> int:
+        return 0 if guild is None else self.versions.get(guild.id, 0)
+
+    def remove(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+        # if the bot's added back, the guild's emoji could be different by then
+        self.versions[guild_id] = self.versions.get(guild_id, 0) + 1
+
+NO_EMOJIS = ({}, {})
+
+class ParseCache:
+    """
+    Size-bounded LRU cache of parsed poll reactions
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> "tuple | None":
+        rxns = self.entries.get(key)
+        if rxns is None:
+            self.misses += 1
+        else:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return rxns
+
+    def put(self, key: tuple, rxns: tuple):
+        self.entries[key] = rxns
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+### TALLIES ###
+
+def _rxn_key(rxn) -> str:
+    """
+    Identifies a reaction the same way no matter where it came from (emoji object, 
+    "<:name:id>" string, unicode string, or a reaction event)
+    """
+    if isinstance(rxn, str): rxn = discord.PartialEmoji.from_str(rxn)
+    # discord isn't consistent about keeping \uFE0F in reaction events, so ignore it
+    return str(rxn.id) if rxn.id else rxn.name.replace("\uFE0F", "")
+
+class PollTally:
+    """
+    Vote counts of one poll. The poll's ID is the ID of the message that made it.
+    """
+    __slots__ = ("id", "guild_id", "channel_id", "author_id", "created_at", "messages", "labels", "counts")
+
+    def __init__(self, id, guild_id, channel_id, author_id, created_at):
+        self.id = id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.created_at = created_at
+        # message id -> keys of the options on that message
+        self.messages: "dict[int, list[str]]" = {}
+        # key -> how the option is shown, and key -> votes. both are in poll order
+        self.labels: "dict[str, str]" = {}
+        self.counts: "dict[str, int]" = {}
+
+    def add_option(self, message_id: int, key: str, label: str, votes: int = 0):
+        self.messages.setdefault(message_id, []).append(key)
+        self.labels[key] = label
+        self.counts[key] = votes
+
+class TallyStore:
+    """
+    Vote counts of every poll the bot made, kept up to date in memory from reaction events.
+    Changes are written to SQLite in batches every TALLY_FLUSH_SECONDS.
+
+    Only polls younger than TALLY_MAX_AGE are kept in memory and counted, older ones can only be
+    read back from the database.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS polls (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            channel_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS poll_options (
+            poll_id INTEGER NOT NULL REFERENCES polls(id) ON DELETE CASCADE,
+            message_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            label TEXT NOT NULL,
+            votes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (poll_id, key)
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.polls: "dict[int, PollTally]" = {}
+        # message id -> poll, for every message a poll has reactions on
+        self.by_message: "dict[int, PollTally]" = {}
+
+        # changes that haven't been written yet
+        self.new: "set[int]" = set()
+        self.changed: "set[tuple[int, str]]" = set()
+        self.deleted: "set[int]" = set()
+
+        self._db: "sqlite3.Connection | None" = None
+        self._db_lock = asyncio.Lock()
+
+    ### IN MEMORY ###
+
+    def register(self, msg: discord.Message, plan: "list[tuple[discord.Message, list]]") -> PollTally:
+        """
+        Starts counting votes for a poll, given the messages its reactions are spread over
+        """
+        tally = PollTally(msg.id, msg.guild and msg.guild.id, msg.channel.id, msg.author.id, time.time())
+        for m, rxns in plan:
+            for rxn in rxns:
+                tally.add_option(m.id, _rxn_key(rxn), str(rxn))
+        self._add(tally)
+        self.new.add(tally.id)
+        return tally
+
+    def _add(self, tally: PollTally):
+        self.polls[tally.id] = tally
+        for mid in tally.messages:
+            self.by_message[mid] = tally
+
+    def vote(self, message_id: int, emoji: discord.PartialEmoji, delta: int):
+        tally = self.by_message.get(message_id)
+        if tally is None: return
+
+        key = _rxn_key(emoji)
+        if key in tally.messages[message_id]:
+            tally.counts[key] = max(0, tally.counts[key] + delta)
+            self.changed.add((tally.id, key))
+
+    def clear(self, message_id: int, emoji: "discord.PartialEmoji | None" = None):
+        """
+        Resets the votes of one option, or every option on a message if no emoji is given
+        """
+        tally = self.by_message.get(message_id)
+        if tally is None: return
+
+        keys = tally.messages[message_id]
+        # the same emoji could be an option on another of the poll's messages too, that one's left alone
+        if emoji is not None: keys = [k for k in keys if k == _rxn_key(emoji)]
+        for key in keys:
+            tally.counts[key] = 0
+            self.changed.add((tally.id, key))
+
+    def remove(self, poll_id: int):
+        tally = self.polls.pop(poll_id, None)
+        if tally is None: return
+
+        for mid in tally.messages:
+            self.by_message.pop(mid, None)
+        self.new.discard(poll_id)
+        self.deleted.add(poll_id)
+
+    ### SQLITE ###
+
+    async def open(self):
+        async with self._db_lock:
+            tallies = await asyncio.to_thread(self._open)
+        for tally in tallies:
+            self._add(tally)
+
+    def _open(self) -> "list[PollTally]":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # only ever used by one thread at a time, under _db_lock
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(self.SCHEMA)
+
+        return self._read("created_at >= ?", time.time() - TALLY_MAX_AGE)
+
+    def _read(self, where: str, arg) -> "list[PollTally]":
+        tallies = {}
+        for row in self._db.execute(f"SELECT id, guild_id, channel_id, author_id, created_at FROM polls WHERE {where}", (arg, )):
+            tallies[row[0]] = PollTally(*row)
+        for poll_id, mid, key, label, votes in self._db.execute(
+                f"SELECT poll_id, message_id, key, label, votes FROM poll_options WHERE poll_id IN "
+                f"(SELECT id FROM polls WHERE {where}) ORDER BY poll_id, position", (arg, )):
+            tallies[poll_id].add_option(mid, key, label, votes)
+        return list(tallies.values())
+
+    async def get(self, poll_id: int) -> "PollTally | None":
+        """
+        A poll by ID, from memory, or from the database if it's too old to still be counted
+        """
+        tally = self.polls.get(poll_id)
+        if tally is not None or self._db is None: return tally
+
+        async with self._db_lock:
+            found = await asyncio.to_thread(self._read, "id = ?", poll_id)
+        return found[0] if found else None
+
+    def evict(self):
+        """
+        Stops counting polls older than TALLY_MAX_AGE, unless they still have changes to write
+        """
+        cutoff = time.time() - TALLY_MAX_AGE
+        pending = self.new | {pid for pid, _ in self.changed}
+        for tally in [t for t in self.polls.values() if t.created_at < cutoff and t.id not in pending]:
+            del self.polls[tally.id]
+            for mid in tally.messages:
+                self.by_message.pop(mid, None)
+
+    async def flush(self):
+        """
+        Writes every change since the last flush
+        """
+        if self._db is None or not (self.new or self.changed or self.deleted): return
+
+        # take a snapshot now, so votes that come in while writing go in the next batch
+        batch = self.new, self.changed, self.deleted
+        self.new, self.changed, self.deleted = set(), set(), set()
+
+        new = [self.polls[pid] for pid in batch[0] if pid in self.polls]
+        changed = [(t.counts[key], pid, key) for pid, key in batch[1] if (t := self.polls.get(pid)) and pid not in batch[0]]
+        deleted = [(pid, ) for pid in batch[2]]
+
+        polls = [(t.id, t.guild_id, t.channel_id, t.author_id, t.created_at) for t in new]
+        options = [
+            (t.id, mid, pos, key, t.labels[key], t.counts[key])
+            for t in new
+            for pos, (mid, key) in enumerate((mid, key) for mid, keys in t.messages.items() for key in keys)
+        ]
+
+        try:
+            async with self._db_lock:
+                await asyncio.to_thread(self._write, polls, options, changed, deleted)
+        except BaseException:
+            # nothing was written (it's one transaction), so try the whole batch again next time
+            self.new |= {pid for pid in batch[0] if pid in self.polls}
+            self.changed |= batch[1]
+            self.deleted |= batch[2]
+            raise
+
+    def _write(self, polls, options, changed, deleted):
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO polls VALUES (?, ?, ?, ?, ?)", polls)
+            self._db.executemany("INSERT OR REPLACE INTO poll_options VALUES (?, ?, ?, ?, ?, ?)", options)
+            self._db.executemany("UPDATE poll_options SET votes = ? WHERE poll_id = ? AND key = ?", changed)
+            self._db.executemany("DELETE FROM polls WHERE id = ?", deleted)
+
+    async def close(self):
+        await self.flush()
+        async with self._db_lock:
+            if self._db is not None:
+                await asyncio.to_thread(self._db.close)
+                self._db = None
+
+### EXPORT ###
+
+class ExportProgress:
+    __slots__ = ("pages", "rows", "started")
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+async def iter_votes(reactions: "list[discord.Reaction]", progress: ExportProgress, skip_id: int = None) \
+        -> "AsyncIterator[tuple[int, str, str]]":
+    """
+    Yields (user id, user name, reaction) for every vote on the given reactions.
+
+    Every reaction's voters are paged through at the same time, at most EXPORT_CONCURRENCY requests at once
+    (discord.py waits out any rate limits it hits). Pages are handed over as they arrive, and at most a few
+    are ever waiting to be written, so the whole set of voters is never held at once.
+    """
+    pages = asyncio.Queue(maxsize=EXPORT_CONCURRENCY * 2)
+    requests = asyncio.Semaphore(EXPORT_CONCURRENCY)
+
+    async def fetch(reaction: discord.Reaction):
+        after = None
+        while True:
+            async with requests:
+                page = [u async for u in reaction.users(limit=EXPORT_PAGE_SIZE, after=after)]
+            progress.pages += 1
+            await pages.put((reaction, page))
+
+            if len(page) < EXPORT_PAGE_SIZE: return
+            after = page[-1]
+
+    async def fetch_all():
+        try:
+            await asyncio.gather(*map(fetch, reactions))
+        finally:
+            await pages.put(None)
+
+    fetcher = asyncio.create_task(fetch_all())
+    try:
+        while (item := await pages.get()) is not None:
+            reaction, page = item
+            for user in page:
+                if user.id == skip_id: continue
+                progress.rows += 1
+                yield user.id, str(user), str(reaction.emoji)
+        await fetcher # raises anything that went wrong while fetching
+    finally:
+        fetcher.cancel()
+
 ### ACTUAL POLLING STUFF ###
 
 class Poll(commands.Cog):
@@ -88,19 +705,107 @@ class Poll(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.emoji_index = GuildEmojiIndex()
+        self.parse_cache = ParseCache(PARSE_CACHE_SIZE)
+        self.tallies = TallyStore(self.poll_db_path(bot))
+        self._flusher = None
+        self._stop_flushing = asyncio.Event()
 
-    def parse_emoji_str(self, s, *, regex=EMOJI_REGEX, message=None, fallback_to_set=True):
+    @staticmethod
+    def poll_db_path(bot) -> Path:
+        path = Path(bot.config.poll_db)
+        # processes of a cluster each count the votes of their own guilds, in their own file.
+        # (so the files only line up with the guilds while sharding.processes stays the same)
+        if bot.ipc is not None:
+            path = path.with_name(f"{path.stem}-{bot.ipc.worker}{path.suffix}")
+        return path
+
+    async def cog_load(self):
+        await self.tallies.open()
+        self._flusher = asyncio.create_task(self.flush_tallies())
+
+    async def cog_unload(self):
+        # cancelling could interrupt a write halfway, let the flusher finish its last round instead
+        self._stop_flushing.set()
+        await self._flusher
+        await self.tallies.close()
+
+    async def flush_tallies(self):
+        while not self._stop_flushing.is_set():
+            try:
+                await asyncio.wait_for(self._stop_flushing.wait(), TALLY_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.tallies.flush()
+            except sqlite3.Error:
+                self.bot.logger.exception("Failed to save poll tallies")
+            self.tallies.evict()
+
+    ### VOTE EVENTS ###
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if payload.user_id != self.bot.user.id:
+            self.tallies.vote(payload.message_id, payload.emoji, 1)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if payload.user_id != self.bot.user.id:
+            self.tallies.vote(payload.message_id, payload.emoji, -1)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        self.tallies.clear(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        self.tallies.clear(payload.message_id, payload.emoji)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        # only deleting the message that made the poll deletes the poll
+        if payload.message_id in self.tallies.polls:
+            self.tallies.remove(payload.message_id)
+
+    ### EMOJI ###
+
+    @commands.Cog.listener()
+    async def on_guild_emojis_update(self, guild, before, after):
+        self.emoji_index.update(guild, after)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.emoji_index.remove(guild.id)
+
+    def parse_emoji_str(self, s, *, mode=EMOJI_MODE, message=None, fallback_to_set=True):
+        guild = message and message.guild
+        key = (s, mode, fallback_to_set, guild and guild.id, self.emoji_index.version(guild))
+
+        rxns = self.parse_cache.get(key)
+        if rxns is None:
+            rxns, cacheable = self._parse_emoji_str(s, mode=mode, message=message, fallback_to_set=fallback_to_set)
+            if cacheable: self.parse_cache.put(key, tuple(rxns))
+        return list(rxns)
+
+    def _parse_emoji_str(self, s, *, mode, message, fallback_to_set) -> "tuple[list, bool]":
+        """
+        Parses reactions, and returns whether the result only depends on the string and the guild's emoji
+        (i.e., it didn't need the message's reactions or emoji from other guilds)
+        """
         rxns = []
         guild = message and message.guild
+        guild_names, guild_ids = self.emoji_index.get(guild) if guild is not None else NO_EMOJIS
+        # custom emoji already reacted on the message, only looked at if needed
+        msg_emojis = None
+        cacheable = True
 
         use_fallback = False
-        for reaction in regex.finditer(s):
+        for lg, m, left, right in TOKENIZER.tokens(s, mode):
             try:
-                lg = reaction.lastgroup
-                m = reaction[lg]
-
                 if lg == 'nrange':
-                    l, r = map(int, [reaction['nL'], reaction['nR']])
+                    l, r = map(int, [left, right])
                     
                     # if 0..10, add [0, 1, ..., 9, 10]
                     # if 10..0, add [10, 9, ..., 1, 0]
@@ -108,7 +813,7 @@ class Poll(commands.Cog):
                     rxns.extend(EMO_MAP[str(o)] for o in range(l, r + sign, sign))
 
                 elif lg == 'arange':
-                    l, r = map(lambda c: ord(c.upper()), [reaction['aL'], reaction['aR']])
+                    l, r = map(lambda c: ord(c.upper()), [left, right])
 
                     # if A..Z, add [A, B, ..., Y, Z]
                     # if Z..A, add [Z, Y, ..., B, A]
@@ -121,8 +826,13 @@ class Poll(commands.Cog):
 
                     # if bot knows emoji, use known emoji
                     # else, check the message for the emoji 
-                    emoji = self.bot.get_emoji(eid) or \
-                            next((r.emoji for r in message.reactions if r.custom_emoji and r.emoji.id == eid), None)
+                    emoji = guild_ids.get(eid)
+                    if not emoji:
+                        cacheable = False
+                        emoji = self.bot.get_emoji(eid)
+                    if not emoji and message is not None:
+                        if msg_emojis is None: msg_emojis = _index_emojis(r.emoji for r in message.reactions if r.custom_emoji)
+                        emoji = msg_emojis[1].get(eid)
                     if emoji: 
                         rxns.append(emoji)
                     elif fallback_to_set: 
@@ -132,11 +842,12 @@ class Poll(commands.Cog):
                 elif lg == "pcustname" and guild is not None:
                     # if we're here then it is a non-nitro user failing to using an animated emoji / out-of-guild emoji
 
-                    emoji = next(
-                            (e for e in guild.emojis if e.name == m), # if emoji in guild
-                            next((r.emoji for r in message.reactions if r.custom_emoji and r.emoji.name == m), # if emoji in message
-                            None) # i dunno
-                        )
+                    # if emoji in guild, else if emoji in message
+                    emoji = guild_names.get(m)
+                    if not emoji:
+                        cacheable = False
+                        if msg_emojis is None: msg_emojis = _index_emojis(r.emoji for r in message.reactions if r.custom_emoji)
+                        emoji = msg_emojis[0].get(m)
                     if emoji:
                         rxns.append(emoji)
                     elif fallback_to_set: 
@@ -157,26 +868,59 @@ class Poll(commands.Cog):
             except: pass
 
         if use_fallback:
-            return [EMO_MAP[c] for c in 'ynm']
+            return [EMO_MAP[c] for c in 'ynm'], cacheable
             
         # remove duplicates (& preserve order)
         rxns = list(dict.fromkeys(rxns))
-        return rxns
+        return rxns, cacheable
 
     @staticmethod
-    async def send_rxns(rxns, msg: discord.Message = None, more_msgs=True):
+    async def spread_rxns(rxns, msg: discord.Message = None, more_msgs=True) -> "list[tuple[discord.Message, list]]":
+        """
+        Splits reactions into chunks of EMOJI_CAP, sending a blank message for every chunk after the first.
+        Returns each message with the reactions that should go on it.
+        """
         chan = msg.channel
         if not msg: msg = await chan.send(BLANK_TEXT) # shouldn't ever happen, but if it does!
 
-        i = 0
-        for rxn in rxns:
-            if more_msgs and i == EMOJI_CAP:
-                i %= EMOJI_CAP
-                msg = await chan.send(BLANK_TEXT)
-            try:
-                await msg.add_reaction(rxn)
-                i += 1
-            except: pass
+        if more_msgs:
+            chunks = [rxns[i:i + EMOJI_CAP] for i in range(0, len(rxns), EMOJI_CAP)] or [[]]
+        else:
+            chunks = [rxns]
+
+        # send the overflow messages first (in order), so all of them can be reacted to at once
+        plan = [(msg, chunks[0])]
+        for chunk in chunks[1:]:
+            plan.append((await chan.send(BLANK_TEXT), chunk))
+        return plan
+
+    @staticmethod
+    async def send_rxns(rxns, msg: discord.Message = None, more_msgs=True) -> "tuple[int, int]":
+        """
+        Reacts to a message, spilling over into blank messages every EMOJI_CAP reactions.
+        Returns how many reactions were added, and how many failed.
+        """
+        plan = await Poll.spread_rxns(rxns, msg, more_msgs)
+        failed = await REACTIONS.react_all(plan)
+        return len(rxns) - failed, failed
+
+    async def start_poll(self, ctx, rxns):
+        """
+        Sends a poll's reactions, and starts counting its votes
+        """
+        start = time.perf_counter()
+        plan = await self.spread_rxns(rxns, ctx.message)
+        self.tallies.register(ctx.message, plan)
+        failed = await REACTIONS.react_all(plan)
+
+        metrics = getattr(self.bot, "metrics", None)
+        if metrics is not None: metrics.observe("send_rxns", time.perf_counter() - start)
+        await self.report_failures(ctx, rxns, failed)
+
+    @staticmethod
+    async def report_failures(ctx, rxns, failed: int):
+        if failed:
+            await ctx.send(f"Couldn't add {failed} of {len(rxns)} reactions.", delete_after=10)
         
     @commands.group(invoke_without_command=True, aliases=["polls"],
         help=add_aliases(f"""\
@@ -201,7 +945,7 @@ class Poll(commands.Cog):
     async def poll(self, ctx, reactions, *, content=''):
         msg = ctx.message
         rxns = self.parse_emoji_str(reactions, message=msg)
-        await self.send_rxns(rxns, msg)
+        await self.start_poll(ctx, rxns)
 
     @poll.command(name="lines",
         help=add_aliases("""\
@@ -221,8 +965,78 @@ class Poll(commands.Cog):
         msg = ctx.message
         msgstr = "\n".join(content.strip().splitlines())
 
-        rxns = self.parse_emoji_str(msgstr, regex=LINE_REGEX, message=msg)
-        await self.send_rxns(rxns, msg)
+        rxns = self.parse_emoji_str(msgstr, mode=LINE_MODE, message=msg)
+        await self.start_poll(ctx, rxns)
+
+    @poll.command(name="results")
+    async def poll_results(self, ctx, poll_id: int):
+        """
+        Shows the votes of a poll, by the ID of the message that made it
+        """
+        tally = await self.tallies.get(poll_id)
+        # polls from other servers aren't anyone's business here
+        if tally is None or tally.guild_id != (ctx.guild and ctx.guild.id):
+            raise commands.BadArgument(f"No poll with the ID {poll_id}.")
+
+        total = sum(tally.counts.values())
+        lines = [f"**Results** ({total} vote{'s' if total != 1 else ''}):"]
+        for key, votes in tally.counts.items():
+            share = votes / total if total else 0
+            lines.append(f"{tally.labels[key]} **{votes}** ({share:.0%})")
+
+        await ctx.send("\n".join(lines))
+
+    @poll.command(name="export")
+    @commands.max_concurrency(1, commands.BucketType.guild)
+    @commands.cooldown(1, EXPORT_COOLDOWN, commands.BucketType.guild)
+    async def poll_export(self, ctx, message: discord.Message):
+        """
+        Sends a CSV of who voted for what on a poll (including its overflow messages)
+        """
+        # the converter finds any message the bot can see, not just the ones the author can
+        if message.guild != ctx.guild or (ctx.guild is None and message.channel != ctx.channel):
+            raise commands.BadArgument("That message isn't in this server.")
+        if not message.channel.permissions_for(ctx.author).read_message_history:
+            raise commands.BadArgument("You can't read the messages in that channel.")
+
+        # any of the poll's messages works, not just the first one
+        tally = self.tallies.by_message.get(message.id) or await self.tallies.get(message.id)
+        msgs = [message]
+        if tally is not None:
+            others = [mid for mid in tally.messages if mid != message.id]
+            msgs += [m for m in await asyncio.gather(*(self.fetch_overflow(message.channel, mid) for mid in others)) if m]
+        reactions = [r for m in msgs for r in m.reactions]
+
+        progress = ExportProgress()
+        async with ctx.typing():
+            # rows go to disk as they come in, not into one big string
+            with tempfile.TemporaryFile() as f:
+                text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(("user_id", "user", "vote"))
+                async for row in iter_votes(reactions, progress, skip_id=self.bot.user.id):
+                    writer.writerow(row)
+                text.flush()
+                text.detach() # so closing the wrapper doesn't close the file
+
+                size = f.tell()
+                limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+                elapsed = progress.elapsed
+                summary = f"{progress.rows} votes, {progress.pages} pages in {elapsed:.1f}s " \
+                          f"({progress.pages / elapsed:.1f} pages/s)"
+
+                if size > limit:
+                    return await ctx.send(f"The export is too big to upload ({size} bytes). {summary}")
+                f.seek(0)
+                await ctx.send(summary, file=discord.File(f, f"poll-{message.id}.csv"))
+
+    @staticmethod
+    async def fetch_overflow(channel, message_id: int) -> "discord.Message | None":
+        # deleting one overflow message shouldn't stop the rest of the poll from being exported
+        try:
+            return await channel.fetch_message(message_id)
+        except discord.NotFound:
+            return None
 
 async def setup(bot):
     await bot.add_cog(Poll(bot))
@@ -0,0 +1,150 @@
+import discord
+from discord.ext import commands
+
+import asyncio
+
+def author_ids(obj) -> "tuple[int]":
+    """
+    IDs in the AUTHORS (or AUTHOR) attribute of a cog or command callback
+    """
+    if hasattr(obj, 'AUTHORS'): devids = obj.AUTHORS
+    elif hasattr(obj, 'AUTHOR'): devids = obj.AUTHOR
+    else: devids = ()
+    # if the dev ids var is an int, it's just the one,
+    # otherwise it's probably an iterable, so take all of its elems
+    if isinstance(devids, int): return (devids, )
+    return tuple(d for d in devids if isinstance(d, int))
+
+class AuthorRegistry:
+    """
+    Who wrote every cog and command, read once when the cog is added.
+
+    Authors are shown as mentions, which don't need the user to be cached. The IDs are still
+    looked up in the background, so IDs that don't belong to anyone are left out.
+    """
+    EVENTS = ("on_cog_add", "on_cog_remove", "on_ready")
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+        # cog name -> (cog, author ids), command name -> author ids (the command's own first, then its cog's)
+        self.cogs: "dict[str, tuple[commands.Cog, tuple[int]]]" = {}
+        self.commands: "dict[str, tuple[int]]" = {}
+
+        # ids that were looked up, and turned out to be users or not
+        self.valid: "set[int]" = set()
+        self.invalid: "set[int]" = set()
+        self._resolving: "set[int]" = set()
+        # lookups running in the background, kept so they aren't garbage collected halfway
+        self._tasks: "set[asyncio.Task]" = set()
+        # bumped whenever an id turns out to be invalid, so anything showing the mentions knows to redo them
+        self.version = 0
+
+    def add_cog(self, cog: commands.Cog):
+        cog_ids = author_ids(cog)
+        self.cogs[cog.qualified_name] = (cog, cog_ids)
+
+        ids = set(cog_ids)
+        for cmd in cog.walk_commands():
+            cmd_ids = self.commands[cmd.qualified_name] = tuple(dict.fromkeys(author_ids(cmd.callback) + cog_ids))
+            ids.update(cmd_ids)
+        self.resolve_later(ids)
+
+    def registered(self, cog: commands.Cog) -> bool:
+        # by identity, a reloaded cog has the same name as the old one
+        return self.cogs.get(cog.qualified_name, (None, ))[0] is cog
+
+    def remove_cog(self, cog: commands.Cog):
+        # it might've already been replaced by a reload
+        if not self.registered(cog): return
+
+        del self.cogs[cog.qualified_name]
+        for cmd in cog.walk_commands():
+            self.commands.pop(cmd.qualified_name, None)
+
+    def ids(self, c: "commands.Command | commands.Cog") -> "tuple[int]":
+        # cog_add listeners run a bit after the cog is added, so catch up if this one isn't in yet
+        cog = c if isinstance(c, commands.Cog) else c.cog
+        if cog is not None and not self.registered(cog):
+            self.add_cog(cog)
+
+        if isinstance(c, commands.Cog): return self.cogs[c.qualified_name][1]
+        if cog is None: return author_ids(c.callback)
+        return self.commands.get(c.qualified_name, ())
+
+    def mentions(self, c: "commands.Command | commands.Cog") -> "list[str]":
+        """
+        Mentions of the authors of a cog or command, ready to be joined into a message
+        """
+        return [f"<@{uid}>" for uid in self.ids(c) if uid not in self.invalid]
+
+    ### RESOLVING ###
+
+    def resolve_later(self, ids):
+        # users can only be fetched once logged in, on_ready picks up anything added before that
+        if self.bot.is_ready():
+            task = asyncio.create_task(self.resolve(ids))
+            self._tasks.add(task)
+            task.add_done_callback(self._resolved)
+
+    def _resolved(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.bot.logger.error("Couldn't look up authors", exc_info=task.exception())
+
+    async def resolve(self, ids):
+        """
+        Looks up every id that hasn't been yet, fetching the users that aren't cached all at once
+        """
+        missing = []
+        for uid in set(ids) - self.valid - self.invalid - self._resolving:
+            if self.bot.get_user(uid) is not None: self.valid.add(uid)
+            else: missing.append(uid)
+
+        self._resolving.update(missing)
+        try:
+            fetched = await asyncio.gather(*(self.bot.fetch_user(uid) for uid in missing), return_exceptions=True)
+        finally:
+            self._resolving.difference_update(missing)
+
+        invalid = len(self.invalid)
+        for uid, user in zip(missing, fetched):
+            if isinstance(user, discord.NotFound): self.invalid.add(uid)
+            elif isinstance(user, discord.User): self.valid.add(uid)
+            elif isinstance(user, discord.HTTPException):
+                self.bot.logger.warning("Couldn't look up author %s: %s", uid, user)
+            elif isinstance(user, BaseException): raise user
+        if len(self.invalid) != invalid: self.version += 1
+
+    ### LISTENERS ###
+
+    async def on_cog_add(self, cog: commands.Cog):
+        if not self.registered(cog): self.add_cog(cog)
+
+    async def on_cog_remove(self, cog: commands.Cog):
+        self.remove_cog(cog)
+
+    async def on_ready(self):
+        # cogs added before login didn't send a cog_add event
+        for cog in self.bot.cogs.values():
+            if not self.registered(cog): self.add_cog(cog)
+
+        ids = {i for _, cog_ids in self.cogs.values() for i in cog_ids}
+        await self.resolve(ids.union(*self.commands.values()))
+
+async def setup(bot: commands.Bot):
+    authors = AuthorRegistry(bot)
+
+    # cogs added before this was loaded (e.g. on a reload)
+    for cog in bot.cogs.values():
+        authors.add_cog(cog)
+
+    for event in authors.EVENTS:
+        bot.add_listener(getattr(authors, event))
+    bot.authors = authors
+
+async def teardown(bot: commands.Bot):
+    authors = bot.authors
+    for event in authors.EVENTS:
+        bot.remove_listener(getattr(authors, event))
+    for task in authors._tasks: task.cancel()
@@ -1,8 +1,18 @@
 import discord
 from discord.ext import commands
 
+import asyncio
 import io
+import time
 import traceback
+from collections import Counter, deque
+
+from core.authors import author_ids
+
+ERROR_HISTORY = 200 # how many errors are kept for ]errors
+
+# the authors of the failing command are looked up in bot.authors, suggestions for unknown commands in bot.suggestions.
+# neither has to be loaded, without them reports fall back to the AUTHORS attributes and there are no suggestions
 
 async def on_command_error(ctx: commands.Context, exc: Exception):
     if isinstance(exc, commands.CommandInvokeError):
@@ -18,7 +28,11 @@ async def on_command_error(ctx: commands.Context, exc: Exception):
         await ctx.send("You can't do that. " + str(exc), delete_after=10)
 
     elif isinstance(exc, commands.CommandNotFound):
-        pass
+        # anything can start with the prefix by accident, so only say something if there's a close match
+        suggester = getattr(ctx.bot, "suggestions", None)
+        suggestion = suggester and await suggester.did_you_mean(ctx, ctx.invoked_with or "")
+        if suggestion:
+            await ctx.send(f"No command called `{ctx.invoked_with}`.{suggestion}", delete_after=10)
 
     elif isinstance(exc, commands.ConversionError):
         await ctx.send(f"Expected a {exc.converter.__name__}", delete_after=10)
@@ -34,63 +48,220 @@ async def on_command_error(ctx: commands.Context, exc: Exception):
     
     elif isinstance(exc, commands.CommandOnCooldown):
         await ctx.send(f":snowflake: Please wait {exc.retry_after} seconds to use this command again.")
+
+    elif isinstance(exc, commands.MaxConcurrencyReached):
+        await ctx.send(":snowflake: That's already running here, wait for it to finish.", delete_after=10)
     
     else:
         await notify_devs(ctx, exc)
 
-async def notify_devs(ctx, exc):
-    bot = ctx.bot
+def fingerprint(exc: BaseException) -> "tuple[str, str, int, str]":
+    """
+    Identifies where an error came from: its type, and the file, line, and function it was raised in
+    """
+    tb = exc.__traceback__
+    if tb is None: return (type(exc).__qualname__, "", 0, "")
 
-    simple_info = "".join(traceback.format_exception_only(type(exc), exc)).strip()
-    info = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__, chain=False))
-    bot.logger.error(info)
-
-    exc_file = discord.File(io.StringIO(info), 'traceback.txt')
-
-    cmd = ctx.command
-    cog = ctx.cog
-
-    if cmd is None or cog is None:
-        await ctx.send(f'{simple_info}, something happened, one of the devs should check the logs.', file=exc_file)
-        return
-
-    devids = []
-    if hasattr(cmd.callback, 'AUTHORS'): cmd_devids = cmd.callback.AUTHORS
-    elif hasattr(cmd.callback, 'AUTHOR'): cmd_devids = cmd.callback.AUTHOR
-    else: cmd_devids = []
-    # if the dev ids var is an int, add it to the list, 
-    # otherwise it's probably an iterable, so just add all elems to the list
-    if isinstance(cmd_devids, int): 
-        devids.append(cmd_devids)
-    else: 
-        devids.extend(cmd_devids)
-
-    if hasattr(cog, 'AUTHORS'): cog_devids = cog.AUTHORS
-    elif hasattr(cog, 'AUTHOR'): cog_devids = cog.AUTHOR
-    else: cog_devids = []
-    # if the dev ids var is an int, add it to the list, 
-    # otherwise it's probably an iterable, so just add all elems to the list
-    if isinstance(cog_devids, int): 
-        devids.append(cog_devids)
-    else: 
-        devids.extend(cog_devids)
-    
-    devids = set(devids)
+    while tb.tb_next is not None: tb = tb.tb_next
+    code = tb.tb_frame.f_code
+    return (type(exc).__qualname__, code.co_filename, tb.tb_lineno, code.co_name)
 
-    if len(devids) == 0:
-        await ctx.send(f'{simple_info}. btw the creator of this command is a coward.', file=exc_file)
-        return
+class ErrorBatch:
+    """
+    Repeats of one error (by fingerprint) within a window after it was first reported, for one error channel
+    """
+    __slots__ = ("exc", "count", "commands", "command", "fallback")
 
-    devs = []
-    for devid in devids:
-        dev = await ctx.bot.fetch_user(devid)
-        if dev is not None: devs.append(dev.mention)
-    
-    if devs:
-        insert = "one of " if len(devs) > 1 else ""
-        await ctx.send(f'{simple_info}. You should probably inform {insert}{", ".join(devs)}.', file=exc_file, allowed_mentions=discord.AllowedMentions.none())
-    else:
-        await ctx.send(f'{simple_info}, but I couldn\'t find the creator of this command.', file=exc_file)
+    def __init__(self, exc: BaseException, command: "commands.Command | None", fallback: discord.abc.Messageable):
+        # only the first one is kept, the repeats only add to the count
+        self.exc = exc
+        self.count = 0
+        self.commands: "dict[str, int]" = {}
+        # None if it didn't come from a cog command at all
+        self.command = command
+        # where the reports go if the error channel can't be found
+        self.fallback = fallback
+
+class ErrorAggregator:
+    """
+    Reports the first time an error happens right away, then groups up its repeats for a window,
+    so an error storm sends at most two reports per error per window instead of one per invocation
+    """
+    def __init__(self):
+        # (channel id, fingerprint) -> batch
+        self.batches: "dict[tuple[int, tuple], ErrorBatch]" = {}
+        # reports being sent, and the waits for the ends of windows
+        self._sending: "set[asyncio.Task]" = set()
+        self._flushers: "set[asyncio.Task]" = set()
+
+    def add(self, ctx: commands.Context, exc: BaseException):
+        bot = ctx.bot
+        channel_id = bot.config.error_channels.get(ctx.guild and ctx.guild.id, ctx.channel.id)
+        key = (channel_id, fingerprint(exc))
+        cmd = ctx.command.qualified_name if ctx.command else "?"
+
+        batch = self.batches.get(key)
+        if batch is not None:
+            batch.count += 1
+            batch.commands[cmd] = batch.commands.get(cmd, 0) + 1
+            summary = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+            bot.logger.warning("Error in %s again (repeat #%d, reported at the end of the window): %s", cmd, batch.count, summary)
+            return
+
+        bot.logger.error("Error in %s", ctx.command, exc_info=exc)
+        # the authors can only be found if it came from a cog command
+        command = ctx.command if ctx.cog is not None else None
+        batch = self.batches[key] = ErrorBatch(exc, command, ctx.channel)
+
+        self._spawn(self._sending, self.send(bot, key[0], batch, self.report(bot, batch, cmd)))
+        self._spawn(self._flushers, self.flush_later(bot, key))
+
+    @staticmethod
+    def _spawn(tasks: "set[asyncio.Task]", coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def flush_later(self, bot: commands.Bot, key):
+        await asyncio.sleep(bot.config.error_window)
+        await self.flush(bot, key)
+
+    async def flush(self, bot: commands.Bot, key):
+        batch = self.batches.pop(key, None)
+        if batch is None or not batch.count: return
+        await self.send(bot, key[0], batch, self.repeat_report(bot, batch))
+
+    async def send(self, bot: commands.Bot, channel_id: int, batch: ErrorBatch, report: dict):
+        channel = bot.get_channel(channel_id) or batch.fallback
+        try:
+            await channel.send(**report, allowed_mentions=discord.AllowedMentions.none())
+        except discord.HTTPException as e:
+            bot.logger.error("Couldn't send an error report to %s: %s", channel_id, e)
+
+    async def flush_all(self, bot: commands.Bot):
+        # first reports still get sent, only the waits for the ends of windows are cut short
+        for task in list(self._flushers): task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        await asyncio.gather(*(self.flush(bot, key) for key in list(self.batches)))
+
+    @staticmethod
+    def report(bot: commands.Bot, batch: ErrorBatch, cmd: str) -> dict:
+        """
+        The full report of the first time an error happened, with its traceback
+        """
+        exc = batch.exc
+        simple_info = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        info = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__, chain=False))
+        exc_file = discord.File(io.StringIO(info), 'traceback.txt')
+        header = f"{simple_info} in `{cmd}`"
+
+        if batch.command is None:
+            return {"content": f'{header}, something happened, one of the devs should check the logs.', "file": exc_file}
+
+        registry = getattr(bot, "authors", None)
+        if registry is not None:
+            ids, devs = registry.ids(batch.command), registry.mentions(batch.command)
+        else:
+            # without core.authors the ids can't have been checked, so mention all of them
+            cmd = batch.command
+            ids = tuple(dict.fromkeys(author_ids(cmd.callback) + author_ids(cmd.cog)))
+            devs = [f"<@{uid}>" for uid in ids]
+        if not ids:
+            return {"content": f'{header}. btw the creator of this command is a coward.', "file": exc_file}
+
+        if devs:
+            insert = "one of " if len(devs) > 1 else ""
+            return {"content": f'{header}. You should probably inform {insert}{", ".join(devs)}.', "file": exc_file}
+        return {"content": f'{header}, but I couldn\'t find the creator of this command.', "file": exc_file}
+
+    @staticmethod
+    def repeat_report(bot: commands.Bot, batch: ErrorBatch) -> dict:
+        """
+        How many more times an error happened in the window after it was reported (its traceback was already sent)
+        """
+        exc = batch.exc
+        simple_info = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        if len(batch.commands) == 1: cmds = f"`{next(iter(batch.commands))}`"
+        else: cmds = ", ".join(f"`{name}` ({n})" for name, n in batch.commands.items())
+        times = "once more" if batch.count == 1 else f"{batch.count} more times"
+        return {"content": f"{simple_info} happened {times} in the last {bot.config.error_window:g}s, in {cmds}"}
+
+ERRORS = ErrorAggregator()
+
+class ErrorRecord:
+    """
+    One error, as kept in the ErrorLog. The traceback is only formatted if someone asks for it.
+    """
+    __slots__ = ("fingerprint", "command", "guild_id", "timestamp", "exc", "_formatted")
+
+    def __init__(self, fingerprint: tuple, command: str, guild_id: "int | None", exc: BaseException):
+        self.fingerprint = fingerprint
+        self.command = command
+        self.guild_id = guild_id
+        self.timestamp = time.time()
+        self.exc = exc
+        self._formatted = None
+
+    @property
+    def summary(self) -> str:
+        return "".join(traceback.format_exception_only(type(self.exc), self.exc)).strip()
+
+    @property
+    def traceback(self) -> str:
+        if self._formatted is None:
+            exc = self.exc
+            self._formatted = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__, chain=False))
+        return self._formatted
+
+class ErrorLog:
+    """
+    The last ERROR_HISTORY errors, plus how often each command was used and failed since the bot started
+    """
+    def __init__(self, size: int):
+        self.recent: "deque[ErrorRecord]" = deque(maxlen=size)
+        self.fingerprints: "Counter[tuple]" = Counter()
+        self.invocations: "Counter[str]" = Counter()
+        self.errors: "Counter[str]" = Counter()
+
+    def record(self, ctx: commands.Context, exc: BaseException):
+        # the locals of every frame would otherwise stay alive as long as the record does
+        if exc.__traceback__ is not None: traceback.clear_frames(exc.__traceback__)
+
+        fp = fingerprint(exc)
+        cmd = ctx.command.qualified_name if ctx.command else "?"
+        self.recent.append(ErrorRecord(fp, cmd, ctx.guild and ctx.guild.id, exc))
+        self.fingerprints[fp] += 1
+        self.errors[cmd] += 1
+
+    async def on_command(self, ctx: commands.Context):
+        # the stub of a lazy command invokes the real one, which is counted then
+        if ctx.command.extras.get("lazy_stub"): return
+        self.invocations[ctx.command.qualified_name] += 1
+
+    def rates(self) -> "list[tuple[str, int, int]]":
+        """
+        (command, errors, uses) of every command that's failed, most errors first
+        """
+        return [(cmd, n, self.invocations[cmd]) for cmd, n in self.errors.most_common()]
+
+ERROR_LOG = ErrorLog(ERROR_HISTORY)
+
+async def notify_devs(ctx, exc):
+    ERROR_LOG.record(ctx, exc)
+    ERRORS.add(ctx, exc)
+
+    # the report goes to the error channel (see ErrorAggregator), the user just gets told
+    simple_info = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+    try:
+        await ctx.send(f'{simple_info}. The devs have been told.', delete_after=30)
+    except discord.HTTPException:
+        pass
 
 async def setup(bot: commands.Bot):
-    bot.add_listener(on_command_error)
\ No newline at end of file
+    bot.add_listener(on_command_error)
+    bot.add_listener(ERROR_LOG.on_command)
+    bot.error_log = ERROR_LOG
+
+async def teardown(bot: commands.Bot):
+    bot.remove_listener(ERROR_LOG.on_command)
+    await ERRORS.flush_all(bot)
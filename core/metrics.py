@@ -0,0 +1,174 @@
+from discord.ext import commands
+
+import asyncio
+import bisect
+
+# upper bounds in seconds, the same for every histogram so they can be compared
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASES = ("parse", "checks", "callback", "send")
+METRICS_HOST = "127.0.0.1"
+
+class Histogram:
+    """
+    Counts of observations that fell in each of BUCKETS (plus one for anything bigger).
+    Recording one is a bisect and two additions.
+    """
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket the q-th quantile falls in (inf if it's past the last one)
+        """
+        if not self.count: return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank: return bound
+        return float("inf")
+
+class CommandStats:
+    __slots__ = ("invocations", "errors", "phases", "total")
+
+    def __init__(self):
+        self.invocations = 0
+        self.errors = 0
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.total = Histogram()
+
+class Metrics:
+    """
+    Per-command invocation & error counts and latency histograms, plus histograms of anything else
+    that's timed through `observe` (like how long poll reactions take).
+    """
+    EVENTS = ("on_command_timed", )
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.commands: "dict[str, CommandStats]" = {}
+        self.timings: "dict[str, Histogram]" = {}
+        self.server: "asyncio.Server | None" = None
+
+    def observe(self, name: str, seconds: float):
+        hist = self.timings.get(name)
+        if hist is None: hist = self.timings[name] = Histogram()
+        hist.observe(seconds)
+
+    async def on_command_timed(self, ctx: commands.Context):
+        # a lazy cog's stub runs the real command once it's loaded, which is timed on its own
+        if ctx.command.extras.get("lazy_stub"): return
+
+        name = ctx.command.qualified_name
+        stats = self.commands.get(name)
+        if stats is None: stats = self.commands[name] = CommandStats()
+
+        stats.invocations += 1
+        if ctx.command_failed: stats.errors += 1
+        for phase, seconds in ctx.timings.items():
+            stats.phases[phase].observe(seconds)
+        stats.total.observe(sum(ctx.timings.values()))
+
+    ### PROMETHEUS ###
+
+    def exposition(self) -> str:
+        """
+        Every metric, in the Prometheus text format
+        """
+        lines = [
+            "# HELP csclub_command_invocations_total Commands invoked.",
+            "# TYPE csclub_command_invocations_total counter",
+            *(f'csclub_command_invocations_total{{command="{name}"}} {s.invocations}' for name, s in self.commands.items()),
+            "# HELP csclub_command_errors_total Commands that failed.",
+            "# TYPE csclub_command_errors_total counter",
+            *(f'csclub_command_errors_total{{command="{name}"}} {s.errors}' for name, s in self.commands.items()),
+            "# HELP csclub_command_seconds Time spent handling commands, by phase.",
+            "# TYPE csclub_command_seconds histogram",
+        ]
+        for name, stats in self.commands.items():
+            for phase, hist in stats.phases.items():
+                lines += self._histogram_lines("csclub_command_seconds", f'command="{name}",phase="{phase}"', hist)
+
+        lines += [
+            "# HELP csclub_timing_seconds Other timed operations.",
+            "# TYPE csclub_timing_seconds histogram",
+        ]
+        for name, hist in self.timings.items():
+            lines += self._histogram_lines("csclub_timing_seconds", f'name="{name}"', hist)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(metric: str, labels: str, hist: Histogram) -> "list[str]":
+        lines, cumulative = [], 0
+        for bound, n in zip(BUCKETS, hist.counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines += [
+            f'{metric}_bucket{{{labels},le="+Inf"}} {hist.count}',
+            f'{metric}_sum{{{labels}}} {hist.sum}',
+            f'{metric}_count{{{labels}}} {hist.count}',
+        ]
+        return lines
+
+    async def serve(self, port: int):
+        # every process of a cluster serves its own metrics, on the next port after the one before it
+        if self.bot.ipc is not None: port += self.bot.ipc.worker
+
+        try:
+            self.server = await asyncio.start_server(self.handle, METRICS_HOST, port)
+        except OSError as e:
+            # the bot works fine without them, so this isn't worth failing to load over
+            self.bot.logger.error(f'Not serving metrics, could not listen on port {port}: {e}')
+            return
+        self.bot.logger.info(f'Serving metrics on http://{METRICS_HOST}:{port}/metrics')
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            # skip the headers, nothing in them matters here
+            while (await reader.readline()).strip(): pass
+
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.exposition().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def setup(bot: commands.Bot):
+    metrics = Metrics(bot)
+    for event in metrics.EVENTS:
+        bot.add_listener(getattr(metrics, event))
+
+    port = bot.config.metrics_port
+    if port is not None:
+        await metrics.serve(port)
+    bot.metrics = metrics
+
+async def teardown(bot: commands.Bot):
+    metrics = bot.metrics
+    for event in metrics.EVENTS:
+        bot.remove_listener(getattr(metrics, event))
+
+    if metrics.server is not None:
+        metrics.server.close()
+        await metrics.server.wait_closed()
@@ -0,0 +1,124 @@
+import discord
+from discord.ext import commands
+
+class GatewayStats:
+    """
+    Keeps count of the guilds, members, and channels the bot can see.
+
+    The counts are kept up to date from gateway events, so reading them never walks the cache.
+    """
+    EVENTS = (
+        "on_ready",
+        "on_guild_available", "on_guild_join",
+        "on_guild_unavailable", "on_guild_remove",
+        "on_member_join", "on_raw_member_remove",
+        "on_guild_channel_create", "on_guild_channel_delete",
+    )
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+        # guild id -> [members, channels]
+        self.counts: "dict[int, list[int]]" = {}
+        self.members = 0
+        self.channels = 0
+
+    @property
+    def guilds(self) -> int:
+        return len(self.counts)
+
+    def add_guild(self, guild: discord.Guild):
+        # guilds are sent again after every reconnect, so replace instead of adding on top
+        self.remove_guild(guild.id)
+
+        members, channels = guild.member_count or 0, len(guild.channels)
+        self.counts[guild.id] = [members, channels]
+        self.members += members
+        self.channels += channels
+
+    def remove_guild(self, guild_id: int):
+        members, channels = self.counts.pop(guild_id, (0, 0))
+        self.members -= members
+        self.channels -= channels
+
+    def snapshot(self) -> "dict[str, int]":
+        return {"guilds": self.guilds, "members": self.members, "channels": self.channels}
+
+    async def totals(self) -> "dict[str, int]":
+        """
+        Counts over every process of the bot, if it's split into several (see cluster.py)
+        """
+        if self.bot.ipc is None:
+            return {"processes": 1, **self.snapshot()}
+        return await self.bot.ipc.query("stats")
+
+    async def log(self):
+        logger = self.bot.logger
+        logger.info(f'Guilds  : {self.guilds}')
+        logger.info(f'Members : {self.members}')
+        logger.info(f'Channels: {self.channels}')
+
+        if self.bot.ipc is not None:
+            totals = await self.totals()
+            logger.info(f'Over {totals["processes"]} processes: {totals.get("guilds", 0)} guilds, ' \
+                        f'{totals.get("members", 0)} members, {totals.get("channels", 0)} channels')
+
+    ### LISTENERS ###
+
+    async def on_ready(self):
+        # forget any guilds that left while the bot was disconnected
+        for gid in self.counts.keys() - {g.id for g in self.bot.guilds}:
+            self.remove_guild(gid)
+        await self.log()
+
+    async def on_guild_available(self, guild: discord.Guild):
+        self.add_guild(guild)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        self.add_guild(guild)
+
+    async def on_guild_unavailable(self, guild: discord.Guild):
+        self.remove_guild(guild.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.remove_guild(guild.id)
+
+    async def on_member_join(self, member: discord.Member):
+        if member.guild.id in self.counts:
+            self.counts[member.guild.id][0] += 1
+            self.members += 1
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # raw, so it still fires if the member wasn't cached
+        if payload.guild_id in self.counts:
+            self.counts[payload.guild_id][0] -= 1
+            self.members -= 1
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        if channel.guild.id in self.counts:
+            self.counts[channel.guild.id][1] += 1
+            self.channels += 1
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if channel.guild.id in self.counts:
+            self.counts[channel.guild.id][1] -= 1
+            self.channels -= 1
+
+async def setup(bot: commands.Bot):
+    stats = GatewayStats(bot)
+
+    # if this is a reload, start off from what's already cached
+    if bot.is_ready():
+        for guild in bot.guilds:
+            stats.add_guild(guild)
+
+    for event in stats.EVENTS:
+        bot.add_listener(getattr(stats, event))
+    if bot.ipc is not None:
+        bot.ipc.handlers["stats"] = stats.snapshot
+    bot.stats = stats
+
+async def teardown(bot: commands.Bot):
+    stats = bot.stats
+    for event in stats.EVENTS:
+        bot.remove_listener(getattr(stats, event))
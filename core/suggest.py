@@ -0,0 +1,136 @@
+from discord.ext import commands
+
+from collections import Counter
+
+MAX_SUGGESTIONS = 3
+# only terms that share at least this much of their trigrams with the query get their edit distance checked
+MIN_OVERLAP = 0.2
+
+def _trigrams(term: str) -> "set[str]":
+    # padded, so short names and the starts of names still have trigrams to match on
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between two strings, or anything over limit if it's more than that
+    """
+    if abs(len(a) - len(b)) > limit: return limit + 1
+
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit: return limit + 1
+        prev = cur
+    return prev[-1]
+
+def category_name(cog: commands.Cog) -> str:
+    """
+    Normally, the category name is just the qualified name of the cog, but it can be overrided
+    by adding a HELP_CATEGORY attribute. Multiple cogs with the same category will be merged into 
+    one category in help.
+    """
+    return getattr(cog, "HELP_CATEGORY", cog.qualified_name)
+
+async def _can_run(cmd: commands.Command, ctx: commands.Context) -> bool:
+    try:
+        return await cmd.can_run(ctx)
+    except commands.CommandError:
+        return False
+
+class SuggestionIndex:
+    """
+    Trigram index over every command name, alias, subcommand, and help category, for "did you mean" suggestions.
+    Hidden commands and lazy stubs are left out. Only valid for one cog_generation of the bot, after that it's rebuilt from scratch.
+    """
+    def __init__(self, bot: commands.Bot):
+        self.generation = bot.cog_generation
+
+        # lowercase term -> what to suggest for it (e.g. an alias suggests itself, not the command it's for),
+        # and the command it's for (None for categories)
+        terms: "dict[str, tuple[str, commands.Command | None]]" = {}
+        for cmd in bot.walk_commands():
+            if cmd.hidden or any(p.hidden for p in cmd.parents): continue
+            # can't tell who could run the real command yet
+            if cmd.extras.get("lazy_stub"): continue
+            parent = cmd.full_parent_name
+            for name in (cmd.name, *cmd.aliases):
+                full = f"{parent} {name}" if parent else name
+                terms.setdefault(full.lower(), (full, cmd))
+        for cog in bot.cogs.values():
+            cat = category_name(cog)
+            terms.setdefault(cat.lower(), (cat, None))
+
+        self.terms = [(term, display, cmd) for term, (display, cmd) in terms.items()]
+        # trigram -> indices of the terms that have it
+        self.postings: "dict[str, list[int]]" = {}
+        self.sizes: "list[int]" = []
+        for i, (term, _, _) in enumerate(self.terms):
+            grams = _trigrams(term)
+            self.sizes.append(len(grams))
+            for g in grams:
+                self.postings.setdefault(g, []).append(i)
+
+    def suggest(self, query: str) -> "list[tuple[str, commands.Command | None]]":
+        """
+        The closest terms to the query (and the commands they're for), closest first.
+        Only terms a few typos away are suggested.
+        """
+        query = query.lower().strip()
+        if not query: return []
+
+        grams = _trigrams(query)
+        shared = Counter()
+        for g in grams:
+            shared.update(self.postings.get(g, ()))
+
+        limit = max(1, len(query) // 3)
+        ranked = []
+        for i, count in shared.items():
+            # dice coefficient, cheap to get and throws out most terms before the edit distance
+            overlap = 2 * count / (len(grams) + self.sizes[i])
+            if overlap < MIN_OVERLAP: continue
+
+            term = self.terms[i][0]
+            dist = _edit_distance(query, term, limit)
+            # a query that's the start of a longer name is fine too (e.g. "foot" for "footprint")
+            if dist <= limit or (len(query) >= 3 and term.startswith(query)):
+                ranked.append((dist, -overlap, i))
+
+        ranked.sort()
+        return [self.terms[i][1:] for _, _, i in ranked]
+
+class Suggester:
+    """
+    Keeps a SuggestionIndex up to date with the bot's commands
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.index: "SuggestionIndex | None" = None
+
+    async def suggest(self, ctx: commands.Context, query: str, n: int = MAX_SUGGESTIONS) -> "list[str]":
+        """
+        The closest names to the query, leaving out commands the author can't use
+        """
+        if self.index is None or self.index.generation != self.bot.cog_generation:
+            self.index = SuggestionIndex(self.bot)
+
+        found = []
+        for display, cmd in self.index.suggest(query):
+            if cmd is not None and not await _can_run(cmd, ctx): continue
+            found.append(display)
+            if len(found) == n: break
+        return found
+
+    async def did_you_mean(self, ctx: commands.Context, query: str) -> str:
+        """
+        " Did you mean ...?" for the closest commands, or nothing if none are close enough
+        """
+        found = await self.suggest(ctx, query)
+        if not found: return ""
+        return " Did you mean " + " or ".join(f"`{ctx.clean_prefix}{s}`" for s in found) + "?"
+
+async def setup(bot: commands.Bot):
+    bot.suggestions = Suggester(bot)
@@ -0,0 +1,121 @@
+from discord.ext import commands
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+TICK_SECONDS = 0.25 # how often the loop is checked on
+STALL_SECONDS = 0.5 # how far behind the loop has to be to count as stalled
+LOG_EVERY = 60 # seconds, at most one stall is logged this often
+LAG_SAMPLES = 240 # one minute of ticks
+STALL_HISTORY = 50
+
+class Stall:
+    """
+    One time the event loop was blocked, with what it was running at the time
+    """
+    __slots__ = ("started", "duration", "task", "stack")
+
+    def __init__(self, task: str, stack: traceback.StackSummary):
+        self.started = time.time()
+        # filled in once the loop gets going again
+        self.duration = None
+        self.task = task
+        self.stack = stack
+
+    def format_stack(self) -> str:
+        return "".join(self.stack.format())
+
+class LoopWatchdog:
+    """
+    Measures how late the event loop is to wake up a sleeping task.
+
+    A separate thread watches for the loop falling far behind. When it does, whatever the loop is stuck on
+    can't report anything itself, so the thread grabs the loop thread's stack and the name of the running task
+    (commands are named "command: <name>" by CSClubBot.invoke, discord.py names events "discord.py: <event>").
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+
+        self.last_tick = time.monotonic()
+        self.samples: "deque[float]" = deque(maxlen=LAG_SAMPLES)
+        self.max_lag = 0.0
+        self.stalls: "deque[Stall]" = deque(maxlen=STALL_HISTORY)
+
+        # set by the watching thread while the loop is stalled, picked up by tick once it's not
+        self._current: "Stall | None" = None
+        self._last_log = 0.0
+        self._unlogged = 0
+
+        self._stop = threading.Event()
+        self._ticker = None
+        self._thread = None
+
+    def start(self):
+        self._ticker = asyncio.create_task(self.tick(), name="loop watchdog")
+        self._thread = threading.Thread(target=self.watch, name="loop watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._ticker is not None: self._ticker.cancel()
+
+    async def tick(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(TICK_SECONDS)
+            now = self.last_tick = time.monotonic()
+
+            lag = max(0.0, now - before - TICK_SECONDS)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            stall, self._current = self._current, None
+            # the thread might've caught the very end of a short hiccup, that's not worth keeping
+            if stall is not None and lag >= STALL_SECONDS:
+                stall.duration = lag
+                self.stalls.append(stall)
+                self.log(stall)
+
+    def watch(self):
+        """
+        Runs in its own thread, for as long as the watchdog is running
+        """
+        while not self._stop.wait(TICK_SECONDS / 2):
+            behind = time.monotonic() - self.last_tick - TICK_SECONDS
+            if behind < STALL_SECONDS or self._current is not None: continue
+
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None: continue
+            # lines are only read when the stack is formatted, and only if it is
+            stack = traceback.StackSummary.extract(traceback.walk_stack(frame), lookup_lines=False)
+            stack.reverse()
+            del frame
+
+            task = asyncio.current_task(self.loop)
+            self._current = Stall(task.get_name() if task is not None else "(no task)", stack)
+
+    def log(self, stall: Stall):
+        now = time.monotonic()
+        if now - self._last_log < LOG_EVERY:
+            self._unlogged += 1
+            return
+
+        also = f" ({self._unlogged} more since the last one)" if self._unlogged else ""
+        self.bot.logger.warning(
+            f"Event loop was blocked for {stall.duration * 1000:.0f}ms by {stall.task}{also}:\n{stall.format_stack()}"
+        )
+        self._last_log, self._unlogged = now, 0
+
+async def setup(bot: commands.Bot):
+    watchdog = LoopWatchdog(bot)
+    watchdog.start()
+    bot.watchdog = watchdog
+
+async def teardown(bot: commands.Bot):
+    bot.watchdog.stop()
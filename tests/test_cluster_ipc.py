@@ -0,0 +1,184 @@
+"""
+Runs an IPCHub with a few IPCClients over localhost, the way the cluster's processes use them
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import cluster
+from cluster import IPCClient, IPCHub, assign_shards
+
+async def start(handlers: list):
+    """
+    A hub on a free port, with one connected client for each of handlers
+    """
+    hub = IPCHub()
+    server = await hub.serve(0)
+    port = server.sockets[0].getsockname()[1]
+
+    clients = []
+    for worker, handler in enumerate(handlers):
+        client = IPCClient(worker, port)
+        client.handlers["stats"] = handler
+        await client.connect()
+        clients.append(client)
+
+    # wait for every hello to get through
+    while len(hub.workers) < len(clients):
+        await asyncio.sleep(0.01)
+    return hub, server, clients
+
+async def stop(server, clients):
+    for client in clients:
+        await client.close()
+    server.close()
+    await server.wait_closed()
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+def test_query_sums_every_worker():
+    async def main():
+        hub, server, clients = await start([lambda i=i: {"guilds": i, "users": 10} for i in range(3)])
+        try:
+            for client in clients:
+                assert await client.query("stats") == {"processes": 3, "guilds": 3, "users": 30}
+        finally:
+            await stop(server, clients)
+    run(main())
+
+def test_unknown_question_gets_empty_answers():
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}] * 2)
+        try:
+            assert await clients[0].query("nothing") == {"processes": 2}
+        finally:
+            await stop(server, clients)
+    run(main())
+
+def test_failing_handler_still_answers(caplog):
+    def broken():
+        raise RuntimeError("oops")
+
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}, broken, lambda: {"guilds": 2}])
+        try:
+            assert await clients[0].query("stats") == {"processes": 3, "guilds": 3}
+            # and the worker that failed is still listening
+            clients[1].handlers["stats"] = lambda: {"guilds": 4}
+            assert await clients[0].query("stats") == {"processes": 3, "guilds": 7}
+        finally:
+            await stop(server, clients)
+    run(main())
+    assert "oops" in caplog.text
+
+def test_worker_leaving_doesnt_hold_up_queries(monkeypatch):
+    # if the hub kept waiting on the worker that left, this would take the whole timeout
+    monkeypatch.setattr(cluster, "COLLECT_TIMEOUT", 60)
+
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}] * 3)
+        try:
+            # stops answering, then leaves while a question is out
+            clients[2]._reader_task.cancel()
+            query = asyncio.create_task(clients[0].query("stats"))
+            await asyncio.sleep(0.1)
+            await clients[2].close()
+            assert await query == {"processes": 2, "guilds": 2}
+        finally:
+            await stop(server, clients)
+    run(main())
+
+def test_bad_message_doesnt_drop_worker():
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}] * 2)
+        try:
+            clients[1]._writer.write(b"not json\n")
+            assert await clients[0].query("stats") == {"processes": 2, "guilds": 2}
+            assert len(hub.workers) == 2
+        finally:
+            await stop(server, clients)
+    run(main())
+
+def test_bad_message_doesnt_stop_client(caplog):
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}] * 2)
+        try:
+            # a collect with no id, then some garbage, straight from the hub
+            for writer in hub.workers.values():
+                writer.write(b'{"op": "collect"}\n[1, 2]\nnot json\n')
+            assert await clients[0].query("stats") == {"processes": 2, "guilds": 2}
+        finally:
+            await stop(server, clients)
+    run(main())
+    assert "Bad message from the hub" in caplog.text
+
+def test_message_without_worker_or_id_doesnt_drop_worker():
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": 1}] * 2)
+        try:
+            clients[1]._writer.write(b'{"op": "hello"}\n{"op": "query"}\n{"op": "reply"}\n')
+            assert await clients[0].query("stats") == {"processes": 2, "guilds": 2}
+            assert len(hub.workers) == 2
+        finally:
+            await stop(server, clients)
+    run(main())
+
+@pytest.mark.parametrize("shard_count, processes", [(1, 1), (4, 2), (10, 3), (5, 5)])
+def test_every_shard_assigned_once(shard_count, processes):
+    shards = assign_shards(shard_count, processes)
+    assert len(shards) == processes
+    assert sorted(s for shard_ids in shards for s in shard_ids) == list(range(shard_count))
+    assert all(shard_ids for shard_ids in shards)
+
+@pytest.mark.parametrize("shard_count, processes", [(2, 3), (4, 0)])
+def test_more_processes_than_shards_rejected(shard_count, processes):
+    with pytest.raises(ValueError):
+        assign_shards(shard_count, processes)
+
+def fake_guild(gid: int, members: int, channels: int):
+    return SimpleNamespace(id=gid, member_count=members, channels=[None] * channels)
+
+def test_stats_totals_over_processes():
+    from core import stats
+
+    async def main():
+        hub, server, clients = await start([None] * 2)
+        try:
+            # a bot for each process, each seeing the guilds on its own shards
+            bots = []
+            for client, guilds in zip(clients, ([fake_guild(1, 10, 3), fake_guild(3, 5, 2)], [fake_guild(2, 7, 4)])):
+                bot = SimpleNamespace(ipc=client, is_ready=lambda: False, add_listener=lambda f: None)
+                await stats.setup(bot)
+                for guild in guilds:
+                    await bot.stats.on_guild_available(guild)
+                bots.append(bot)
+
+            expected = {"processes": 2, "guilds": 3, "members": 22, "channels": 9}
+            for bot in bots:
+                assert await bot.stats.totals() == expected
+
+            # only the process that has the guild sees it leave
+            await bots[0].stats.on_guild_remove(fake_guild(3, 5, 2))
+            assert await bots[1].stats.totals() == {"processes": 2, "guilds": 2, "members": 17, "channels": 7}
+        finally:
+            await stop(server, clients)
+    run(main())
+
+def test_answer_that_fails_is_logged(caplog, monkeypatch):
+    monkeypatch.setattr(cluster, "COLLECT_TIMEOUT", 0.2)
+
+    async def main():
+        hub, server, clients = await start([lambda: {"guilds": "not a number"}, lambda: {"guilds": 1}])
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await clients[0].query("stats")
+            assert not hub._answering
+            # and the next one still gets through
+            clients[0].handlers["stats"] = lambda: {"guilds": 2}
+            assert await clients[0].query("stats") == {"processes": 2, "guilds": 3}
+        finally:
+            await stop(server, clients)
+    run(main())
+    assert "Couldn't answer a query" in caplog.text
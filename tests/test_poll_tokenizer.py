@@ -0,0 +1,202 @@
+"""
+Checks the poll tokenizer against the regexes it replaced, token for token and reaction for reaction.
+
+    python -m pytest tests/test_poll_tokenizer.py
+    python -m tests.test_poll_tokenizer          # benchmark
+"""
+import random
+import re
+import time
+import warnings
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+emoji = pytest.importorskip("emoji")
+if not hasattr(emoji, "get_emoji_regexp"):
+    pytest.skip("the old regex needs emoji < 2.0", allow_module_level=True)
+
+from cogs import poll
+from cogs.poll import EMO_MAP, EMOJI_MODE, LINE_MODE, TOKENIZER
+
+### THE OLD REGEXES ###
+# as they were in cogs/poll.py before the tokenizer
+
+CUSTOM_EMOJI_REGEX = r"(?:<a?:\w+?:(?P<custom>\d+)>)"
+PC_EMOJI_REGEX = r"(?::(?P<pcustname>\w+?):)"
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    _all_unicode_emoji = emoji.get_emoji_regexp().pattern + r"|[\U0001F1E6-\U0001F1FF]"
+UNI_EMOJI_REGEX = "(?P<emoji>(?:{})\uFE0F*)".format(_all_unicode_emoji)
+MISC_REGEX = r"(?P<misc>.)"
+NUM_RANGE_REGEX = r"(?P<nrange>(?P<nL>10|\d)(?:-|\.\.)(?P<nR>10|\d))"
+ALPHA_RANGE_REGEX = r"(?P<arange>(?P<aL>[A-Za-z])(?:-|\.\.)(?P<aR>[A-Za-z]))"
+
+_raw_emoji_regex = f"{CUSTOM_EMOJI_REGEX}|{PC_EMOJI_REGEX}|{UNI_EMOJI_REGEX}"
+EMOJI_REGEX = re.compile(f"{NUM_RANGE_REGEX}|{ALPHA_RANGE_REGEX}|{_raw_emoji_regex}|{MISC_REGEX}")
+LINE_REGEX = re.compile(f"^(?:{UNI_EMOJI_REGEX})", re.M)
+REGEXES = {EMOJI_MODE: EMOJI_REGEX, LINE_MODE: LINE_REGEX}
+
+def regex_tokens(s: str, mode: str) -> list:
+    tokens = []
+    for match in REGEXES[mode].finditer(s):
+        lg = match.lastgroup
+        if lg == "nrange": tokens.append((lg, match[lg], match["nL"], match["nR"]))
+        elif lg == "arange": tokens.append((lg, match[lg], match["aL"], match["aR"]))
+        else: tokens.append((lg, match[lg], None, None))
+    return tokens
+
+def regex_parse(bot, s: str, mode: str, message, fallback_to_set: bool) -> list:
+    """
+    Poll.parse_emoji_str as it was before the tokenizer
+    """
+    rxns = []
+    guild = message and message.guild
+
+    use_fallback = False
+    for reaction in REGEXES[mode].finditer(s):
+        try:
+            lg = reaction.lastgroup
+            m = reaction[lg]
+
+            if lg == 'nrange':
+                l, r = map(int, [reaction['nL'], reaction['nR']])
+                sign = 1 if l <= r else -1
+                rxns.extend(EMO_MAP[str(o)] for o in range(l, r + sign, sign))
+
+            elif lg == 'arange':
+                l, r = map(lambda c: ord(c.upper()), [reaction['aL'], reaction['aR']])
+                sign = 1 if l <= r else -1
+                rxns.extend(EMO_MAP[chr(o)] for o in range(l, r + sign, sign))
+
+            elif lg == 'custom':
+                eid = int(m)
+                emoji = bot.get_emoji(eid) or \
+                        next((r.emoji for r in message.reactions if r.custom_emoji and r.emoji.id == eid), None)
+                if emoji:
+                    rxns.append(emoji)
+                elif fallback_to_set:
+                    use_fallback = True
+                    break
+
+            elif lg == "pcustname" and guild is not None:
+                emoji = next(
+                        (e for e in guild.emojis if e.name == m),
+                        next((r.emoji for r in message.reactions if r.custom_emoji and r.emoji.name == m),
+                        None)
+                    )
+                if emoji:
+                    rxns.append(emoji)
+                elif fallback_to_set:
+                    use_fallback = True
+                    break
+
+            elif lg == 'emoji':
+                rxns.append(m)
+
+            elif lg == 'misc':
+                emoji = EMO_MAP.get(m, None)
+                if emoji:
+                    rxns.append(emoji)
+                elif fallback_to_set:
+                    use_fallback = True
+                    break
+
+        except: pass
+
+    if use_fallback:
+        return [EMO_MAP[c] for c in 'ynm']
+    return list(dict.fromkeys(rxns))
+
+### FIXTURES ###
+
+# a guild emoji, and an emoji from some other guild that's only on the message
+# (reactions get deduplicated, so these need to be hashable like discord.Emoji)
+Emoji = namedtuple("Emoji", "id name")
+HELLO = Emoji(111, "hello")
+WAVE = Emoji(222, "wave")
+
+PIECES = [
+    *"0123456789-.:<>a_bZz?!+ \n", "10", "..", "\uFE0F", "\u20E3", "\u0663", "\u00E9", "\u200D",
+    "<:yes:123>", "<a:x:9>", "<:a:>", ":wave:", ":hello:", ":nope:", "<:hello:111>", "<a:wave:222>", "<:gone:333>",
+    "\U0001F1E6", "\U0001F1FA\U0001F1F8", "1\uFE0F\u20E3",
+]
+EXAMPLES = [
+    "", "ynm", "0-10", "A-Z", "ABCD", "10..0", "1-100", "a..z", "\U0001F641\U0001F642",
+    "<:yes:826351259636072478>", ":hello:", "\U0001F338 Spring\n\u2600\uFE0F Summer\n\U0001F342 Fall\n\u2744\uFE0F Winter",
+]
+
+def make_corpus(n: int, seed: int = 1) -> "list[str]":
+    rng = random.Random(seed)
+    emojis = poll._unicode_emoji()
+    corpus = list(EXAMPLES)
+    for _ in range(n):
+        k = rng.randint(1, 12)
+        corpus.append("".join(rng.choice(emojis) if rng.random() < 0.3 else rng.choice(PIECES) for _ in range(k)))
+    return corpus
+
+CORPUS = make_corpus(5000)
+
+def make_message(in_guild: bool):
+    guild = SimpleNamespace(id=1, emojis=[HELLO]) if in_guild else None
+    return SimpleNamespace(guild=guild, reactions=[SimpleNamespace(custom_emoji=True, emoji=WAVE)])
+
+@pytest.fixture
+def cog():
+    # only the parts of the cog parsing needs
+    cog = poll.Poll.__new__(poll.Poll)
+    cog.bot = SimpleNamespace(get_emoji={HELLO.id: HELLO}.get)
+    cog.emoji_index = poll.GuildEmojiIndex()
+    cog.parse_cache = poll.ParseCache(poll.PARSE_CACHE_SIZE)
+    return cog
+
+### TESTS ###
+
+@pytest.mark.parametrize("mode", [EMOJI_MODE, LINE_MODE])
+def test_tokens_match_regex(mode):
+    for s in CORPUS:
+        assert list(TOKENIZER.tokens(s, mode)) == regex_tokens(s, mode), s
+
+@pytest.mark.parametrize("mode", [EMOJI_MODE, LINE_MODE])
+@pytest.mark.parametrize("fallback_to_set", [True, False])
+@pytest.mark.parametrize("in_guild", [True, False])
+def test_parse_matches_regex(cog, mode, fallback_to_set, in_guild):
+    message = make_message(in_guild)
+    for s in CORPUS:
+        expected = regex_parse(cog.bot, s, mode, message, fallback_to_set)
+        assert cog.parse_emoji_str(s, mode=mode, message=message, fallback_to_set=fallback_to_set) == expected, s
+        # and again, from the cache this time
+        assert cog.parse_emoji_str(s, mode=mode, message=message, fallback_to_set=fallback_to_set) == expected, s
+
+def test_tokenizer_round_trips_through_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(poll, "TRIE_CACHE_DIR", tmp_path)
+    built = poll._load_tokenizer()
+    assert len(list(tmp_path.glob("emoji_trie-*.json"))) == 1
+    loaded = poll._load_tokenizer()
+    assert loaded.trie == built.trie == TOKENIZER.trie
+    for s in CORPUS:
+        assert list(loaded.tokens(s)) == list(TOKENIZER.tokens(s))
+
+def test_mangled_cache_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(poll, "TRIE_CACHE_DIR", tmp_path)
+    poll._load_tokenizer()
+    for path in tmp_path.glob("emoji_trie-*.json"):
+        path.write_text('{"version": "0", "format": 3, "trie": [')
+    assert poll._load_tokenizer().trie == TOKENIZER.trie
+
+### BENCHMARK ###
+
+def benchmark(n: int = 30000, rounds: int = 5):
+    corpus = make_corpus(n)
+    for mode in (EMOJI_MODE, LINE_MODE):
+        for name, tokens in (("regex", regex_tokens), ("tokenizer", lambda s, mode: list(TOKENIZER.tokens(s, mode)))):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for s in corpus: tokens(s, mode)
+                best = min(best, time.perf_counter() - start)
+            print(f"{mode:>6} {name:>9}: {best * 1e6 / len(corpus):6.2f}us per string")
+
+if __name__ == "__main__":
+    benchmark()